@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
 PROJECT_DIR_NAME = 'yatube'
@@ -37,3 +39,16 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def inline_thumbnails(settings):
+    """Версии картинок создаются сразу: фоновый поток не должен писать
+    во временный MEDIA_ROOT (`mock_media`) после его удаления."""
+    settings.THUMBNAIL_WORKERS = 0
+
+
+@pytest.fixture(autouse=True)
+def enforce_query_budgets(settings):
+    """Бюджеты SQL-запросов обязательны, как в `manage.py test`."""
+    settings.QUERY_BUDGET_RAISE = True
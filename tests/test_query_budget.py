@@ -0,0 +1,40 @@
+import pytest
+from django.core.cache import cache
+from mixer.backend.django import mixer
+
+from core.query_budget import QueryBudgetExceeded
+from posts.models import Comment, Follow, Post
+
+pytestmark = [pytest.mark.django_db]
+
+
+class TestQueryBudget:
+
+    @pytest.fixture(autouse=True)
+    def feeds(self, user, another_user, group):
+        cache.clear()
+        Follow.objects.create(user=user, author=another_user)
+        posts = mixer.cycle(20).blend(Post, author=another_user, group=group,
+                                      image='')
+        for post in posts[:5]:
+            mixer.cycle(3).blend(Comment, post=post, author=user)
+        self.post = posts[0]
+
+    def test_feeds_within_budget(self, user_client, another_user, group):
+        urls = [
+            '/',
+            f'/group/{group.slug}/',
+            f'/profile/{another_user.username}/',
+            '/follow/',
+            f'/posts/{self.post.pk}/',
+        ]
+        for url in urls:
+            response = user_client.get(url)
+            assert response.status_code == 200, (
+                f'Страница `{url}` работает неправильно'
+            )
+
+    def test_budget_exceeded_raises(self, client, settings):
+        settings.QUERY_BUDGETS = {'posts:main': 1}
+        with pytest.raises(QueryBudgetExceeded):
+            client.get('/')
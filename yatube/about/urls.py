@@ -1,3 +1,4 @@
+from core.replicas import read_replica
 from django.urls import path
 
 from . import views
@@ -5,6 +6,8 @@ from . import views
 app_name = 'about'
 
 urlpatterns = [
-    path('author/', views.AboutAuthorView.as_view(), name='author'),
-    path('tech/', views.AboutTechView.as_view(), name='tech'),
+    path('author/', read_replica(views.AboutAuthorView.as_view()),
+         name='author'),
+    path('tech/', read_replica(views.AboutTechView.as_view()),
+         name='tech'),
 ]
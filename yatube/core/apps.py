@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import db, metrics  # noqa: F401
+        metrics.install_template_timer()
@@ -0,0 +1,15 @@
+"""SQLite с выбором режима BEGIN.
+
+Обычный BEGIN откладывает блокировку до первой записи. Если к этому
+моменту другой процесс уже пишет или успел закоммитить, SQLite не
+ждет (busy_timeout тут не помогает), а сразу отвечает «database is
+locked». С TRANSACTION_MODE = 'IMMEDIATE' в настройках базы транзакция
+берет блокировку записи в самом начале и честно ждет ее в очереди.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict.get('TRANSACTION_MODE')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -0,0 +1,84 @@
+"""Кэширование с защитой от «эффекта толпы» (cache stampede).
+
+Значение хранится вместе со временем его вычисления и сроком жизни.
+get_or_recompute:
+
+* обновляет значение заранее с вероятностью, растущей по мере
+  приближения к истечению срока (probabilistic early expiration,
+  XFetch), поэтому популярный ключ не истекает у всех воркеров разом;
+* пересчитывает значение только в одном воркере (single flight):
+  остальные получают прежнее значение или коротко ждут результата.
+"""
+import math
+import random
+import time
+
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache import cache as default_cache
+
+from . import metrics
+
+LOCK_TIMEOUT = 10
+WAIT_TIMEOUT = 2
+WAIT_STEP = 0.05
+
+
+def fragment_cache():
+    """Кэш фрагментов шаблонов: template_fragments, если он настроен."""
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _should_refresh(delta, expiry, beta):
+    # 1 - random() лежит в (0, 1], логарифм определен.
+    jitter = -delta * beta * math.log(1 - random.random())
+    return time.time() + jitter >= expiry
+
+
+def _wait_for(key, cache):
+    deadline = time.time() + WAIT_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_recompute(key, compute, timeout, cache=default_cache, beta=1.0):
+    """Возвращает значение ключа, вычисляя его ``compute()`` при промахе.
+
+    ``beta`` > 1 обновляет раньше, < 1 — позже; 0 отключает раннее
+    обновление.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, expiry = entry
+        if not _should_refresh(delta, expiry, beta):
+            metrics.record_cache(hit=True)
+            return value
+    if not cache.add(_lock_key(key), 1, LOCK_TIMEOUT):
+        # Значение уже пересчитывает другой воркер.
+        if entry is None:
+            entry = _wait_for(key, cache)
+        if entry is not None:
+            metrics.record_cache(hit=True)
+            return entry[0]
+        metrics.record_cache(hit=False)
+        return compute()
+    metrics.record_cache(hit=False)
+    try:
+        start = time.time()
+        value = compute()
+        delta = time.time() - start
+        expiry = math.inf if timeout is None else time.time() + timeout
+        cache.set(key, (value, delta, expiry), timeout)
+        return value
+    finally:
+        cache.delete(_lock_key(key))
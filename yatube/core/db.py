@@ -0,0 +1,19 @@
+"""Настройка новых соединений SQLite.
+
+Прагмы из ключа PRAGMAS настроек базы (см. DATABASE_PROFILES)
+выполняются при каждом подключении: WAL разрешает читать, пока идет
+запись, а busy_timeout заставляет писателей ждать блокировку, а не
+сразу падать с «database is locked».
+"""
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS') or {}
+    for name, value in pragmas.items():
+        # Напрямую в sqlite3, мимо счетчиков запросов core.metrics.
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from core import metrics
+
+SORT_KEYS = {
+    'avg': lambda row: row['avg'],
+    'p95': lambda row: row['p95'],
+    'total': lambda row: row['total'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Выводит самые медленные представления по собранным метрикам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--sort', choices=SORT_KEYS, default='p95',
+                            help='среднее, 95-й перцентиль или общее время')
+
+    def handle(self, *args, **options):
+        rows = []
+        for view, stats in metrics.collect().items():
+            requests = stats['requests']
+            if not requests:
+                continue
+            cache_total = stats['cache_hits'] + stats['cache_misses']
+            rows.append({
+                'view': view,
+                'requests': requests,
+                'total': stats['request_duration']['sum'],
+                'avg': stats['request_duration']['sum'] / requests,
+                'p95': metrics.quantile(stats['request_duration'], 0.95,
+                                        metrics.TIME_BUCKETS),
+                'queries': stats['db_queries']['sum'] / requests,
+                'db': stats['db_duration']['sum'] / requests,
+                'template': stats['template_duration']['sum'] / requests,
+                'hit_ratio': (stats['cache_hits'] / cache_total
+                              if cache_total else None),
+            })
+        if not rows:
+            self.stdout.write('Метрик пока нет: запросов не было или кэш '
+                              'не общий для процессов (YATUBE_CACHE).')
+            return
+        rows.sort(key=SORT_KEYS[options['sort']], reverse=True)
+        self.stdout.write(
+            f'{"представление":<32} {"запросов":>8} {"ср., мс":>8} '
+            f'{"p95, мс":>8} {"SQL":>6} {"SQL, мс":>8} {"шаблон, мс":>10} '
+            f'{"кэш":>5}'
+        )
+        for row in rows[:options['limit']]:
+            hit_ratio = ('-' if row['hit_ratio'] is None
+                         else f'{row["hit_ratio"]:.0%}')
+            self.stdout.write(
+                f'{row["view"]:<32} {row["requests"]:>8} '
+                f'{row["avg"] * 1000:>8.1f} {row["p95"] * 1000:>8.0f} '
+                f'{row["queries"]:>6.1f} {row["db"] * 1000:>8.1f} '
+                f'{row["template"] * 1000:>10.1f} {hit_ratio:>5}'
+            )
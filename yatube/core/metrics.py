@@ -0,0 +1,290 @@
+"""Метрики производительности запросов.
+
+MetricsMiddleware замеряет для каждого запроса время ответа, число и
+время SQL-запросов, время рендеринга шаблонов и попадания во
+фрагментный кэш (core.cache), а затем добавляет замеры в гистограммы
+своего представления (view_name из resolver_match).
+
+Гистограммы живут в памяти процесса: запись — несколько сложений под
+блокировкой. Раз в METRICS_FLUSH_INTERVAL секунд процесс сохраняет
+свой снимок в общий кэш; /metrics и команда slow_views складывают
+снимки всех процессов.
+"""
+import copy
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from . import query_budget
+
+PREFIX = 'yatube'
+SNAPSHOT_KEY = 'metrics:worker:{}'
+WORKERS_KEY = 'metrics:workers'
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# Гистограммы: имя, единица, границы корзин, описание.
+HISTOGRAMS = (
+    ('request_duration', 'seconds', TIME_BUCKETS, 'Время ответа'),
+    ('db_queries', '', QUERY_BUCKETS, 'Число SQL-запросов'),
+    ('db_duration', 'seconds', TIME_BUCKETS, 'Время SQL-запросов'),
+    ('template_duration', 'seconds', TIME_BUCKETS,
+     'Время рендеринга шаблонов'),
+)
+COUNTERS = (
+    ('cache_hits', 'Попадания во фрагментный кэш'),
+    ('cache_misses', 'Промахи фрагментного кэша'),
+)
+
+_current = ContextVar('request_metrics', default=None)
+_lock = threading.Lock()
+_views = {}
+_last_flush = time.monotonic()
+_worker = f'{socket.gethostname()}:{os.getpid()}'
+
+
+_UNKNOWN = object()
+
+
+class RequestMetrics:
+    """Замеры одного запроса."""
+    __slots__ = ('request', 'budget', 'queries', 'stacks', 'db_duration',
+                 'template_duration', 'template_depth', 'cache_hits',
+                 'cache_misses')
+
+    def __init__(self, request):
+        self.request = request
+        self.budget = _UNKNOWN
+        self.queries = []
+        self.stacks = []
+        self.db_duration = 0.0
+        self.template_duration = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def db_queries(self):
+        return len(self.queries)
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_duration += time.perf_counter() - start
+            self.queries.append(sql)
+            if self.budget is _UNKNOWN:
+                # Бюджет известен, только когда адрес уже разобран.
+                if getattr(self.request, 'resolver_match', None):
+                    self.budget = query_budget.get_budget(self.request)
+            elif self.budget is not None and (
+                len(self.queries) > self.budget
+            ):
+                self.stacks.append(query_budget.stack_summary())
+
+
+def _empty_view():
+    stats = {name: 0 for name, _ in COUNTERS}
+    stats['requests'] = 0
+    for name, _, buckets, _ in HISTOGRAMS:
+        stats[name] = {'buckets': [0] * (len(buckets) + 1), 'sum': 0}
+    return stats
+
+
+def record(view_name, duration, metrics):
+    """Добавляет замеры запроса в гистограммы представления."""
+    values = {
+        'request_duration': duration,
+        'db_queries': metrics.db_queries,
+        'db_duration': metrics.db_duration,
+        'template_duration': metrics.template_duration,
+    }
+    with _lock:
+        stats = _views.setdefault(view_name, _empty_view())
+        stats['requests'] += 1
+        stats['cache_hits'] += metrics.cache_hits
+        stats['cache_misses'] += metrics.cache_misses
+        for name, _, buckets, _ in HISTOGRAMS:
+            histogram = stats[name]
+            histogram['buckets'][bisect_left(buckets, values[name])] += 1
+            histogram['sum'] += values[name]
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '<unresolved>'
+
+
+def track(request, get_response):
+    """Выполняет запрос, замеряя его; возвращает ответ."""
+    metrics = RequestMetrics(request)
+    token = _current.set(metrics)
+    start = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(metrics.execute)
+                )
+            response = get_response(request)
+    finally:
+        _current.reset(token)
+    name = view_name(request)
+    record(name, time.perf_counter() - start, metrics)
+    maybe_flush()
+    query_budget.check(name, query_budget.get_budget(request),
+                       metrics.queries, metrics.stacks)
+    return response
+
+
+def record_cache(hit):
+    """Отмечает попадание или промах фрагментного кэша."""
+    metrics = _current.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+def install_template_timer():
+    """Засекает рендеринг шаблонов верхнего уровня (включения внутри
+    шаблона уже учтены временем внешнего)."""
+    from django.template.backends.django import Template
+
+    render = Template.render
+    if getattr(render, 'timed', False):
+        return
+
+    def timed_render(self, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return render(self, *args, **kwargs)
+        metrics.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_duration += time.perf_counter() - start
+
+    timed_render.timed = True
+    Template.render = timed_render
+
+
+def snapshot():
+    with _lock:
+        return copy.deepcopy(_views)
+
+
+def reset():
+    with _lock:
+        _views.clear()
+
+
+def flush():
+    """Сохраняет снимок процесса в общий кэш."""
+    global _last_flush
+    _last_flush = time.monotonic()
+    timeout = settings.METRICS_FLUSH_INTERVAL * 10
+    cache.set(SNAPSHOT_KEY.format(_worker), snapshot(), timeout)
+    workers = cache.get(WORKERS_KEY, [])
+    if _worker not in workers:
+        cache.set(WORKERS_KEY, [*workers, _worker], None)
+
+
+def maybe_flush():
+    if time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def _merge(target, stats):
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            target[key]['sum'] += value['sum']
+            target[key]['buckets'] = [
+                a + b for a, b in zip(target[key]['buckets'],
+                                      value['buckets'])
+            ]
+        else:
+            target[key] += value
+
+
+def collect():
+    """Сумма снимков всех процессов: {view_name: stats}.
+
+    Свои данные процесс берет из памяти, а не из последнего снимка.
+    """
+    workers = cache.get(WORKERS_KEY, [])
+    snapshots = cache.get_many([SNAPSHOT_KEY.format(w) for w in workers])
+    alive = [w for w in workers if SNAPSHOT_KEY.format(w) in snapshots]
+    if alive != workers:
+        cache.set(WORKERS_KEY, alive, None)
+    snapshots[SNAPSHOT_KEY.format(_worker)] = snapshot()
+    views = {}
+    for views_snapshot in snapshots.values():
+        for view, stats in views_snapshot.items():
+            _merge(views.setdefault(view, _empty_view()), stats)
+    return views
+
+
+def quantile(histogram, q, buckets):
+    """Оценка квантиля по гистограмме: верхняя граница корзины."""
+    total = sum(histogram['buckets'])
+    if not total:
+        return 0
+    rank = q * total
+    seen = 0
+    for bound, count in zip((*buckets, float('inf')), histogram['buckets']):
+        seen += count
+        if seen >= rank:
+            return bound if bound != float('inf') else buckets[-1]
+    return buckets[-1]
+
+
+def _metric_name(name, unit):
+    return f'{PREFIX}_{name}_{unit}' if unit else f'{PREFIX}_{name}'
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def render_prometheus(views):
+    """Метрики в текстовом формате Prometheus 0.0.4."""
+    lines = []
+    for name, unit, buckets, help_text in HISTOGRAMS:
+        metric = _metric_name(name, unit)
+        lines += [f'# HELP {metric} {help_text}',
+                  f'# TYPE {metric} histogram']
+        for view, stats in sorted(views.items()):
+            label = f'view="{_label(view)}"'
+            histogram = stats[name]
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'),
+                                    histogram['buckets']):
+                cumulative += count
+                lines.append(
+                    f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{metric}_sum{{{label}}} {histogram["sum"]}')
+            lines.append(f'{metric}_count{{{label}}} {stats["requests"]}')
+    for name, help_text in COUNTERS:
+        metric = f'{PREFIX}_{name}_total'
+        lines += [f'# HELP {metric} {help_text}',
+                  f'# TYPE {metric} counter']
+        for view, stats in sorted(views.items()):
+            lines.append(f'{metric}{{view="{_label(view)}"}} {stats[name]}')
+    return '\n'.join(lines) + '\n'
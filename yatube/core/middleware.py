@@ -0,0 +1,22 @@
+from . import metrics, replicas
+
+
+class MetricsMiddleware:
+    """Собирает метрики производительности запросов (core.metrics)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return metrics.track(request, self.get_response)
+
+
+class ReplicaPinMiddleware:
+    """Прикрепляет к основной базе пользователя, который только что
+    писал (core.replicas)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return replicas.track_writes(request, self.get_response)
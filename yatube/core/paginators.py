@@ -0,0 +1,168 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+PER_PAGE = 10
+
+
+class CursorPage(Page):
+    """Страница курсорного пагинатора.
+
+    Вместо номера страницы хранит непрозрачные токены соседних страниц.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, cursor='', next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        # Используется как ключ фрагментного кэша: должен различать страницы.
+        return f'<Cursor page {self.cursor!r}>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинатор по паре (pub_date, id).
+
+    Не выполняет COUNT(*) и OFFSET: каждая страница выбирается
+    одним запросом по индексу, независимо от глубины.
+
+    ``fields`` — другие поля даты и id, например аннотации выборки,
+    которая читается по индексу другой таблицы.
+    """
+    date_field = 'pub_date'
+    pk_field = 'pk'
+
+    def __init__(self, object_list, per_page=PER_PAGE, fields=None):
+        super().__init__(object_list, per_page)
+        if fields is not None:
+            self.date_field, self.pk_field = fields
+
+    def encode_cursor(self, obj, reverse=False):
+        date = getattr(obj, self.date_field)
+        pk = getattr(obj, self.pk_field)
+        raw = f'{"p" if reverse else "n"}|{date.isoformat()}|{pk}'
+        token = base64.urlsafe_b64encode(raw.encode())
+        return token.decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Возвращает (reverse, pub_date, pk) или None для первой страницы."""
+        if not cursor:
+            return None
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(cursor + padding).decode()
+            direction, date, pk = raw.split('|')
+            date = parse_datetime(date)
+            pk = int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        if direction not in ('n', 'p') or date is None:
+            return None
+        return direction == 'p', date, pk
+
+    @cached_property
+    def ordered_list(self):
+        return self.object_list.order_by(f'-{self.date_field}',
+                                         f'-{self.pk_field}')
+
+    def get_page(self, cursor):
+        """Возвращает страницу по токену; битый токен ведет на первую."""
+        position = self.decode_cursor(cursor)
+        if position is None:
+            page = self._page_after(None)
+        elif position[0]:
+            page = self._page_before(*position[1:])
+        else:
+            page = self._page_after(position[1:])
+        page.cursor = cursor or ''
+        return page
+
+    def page(self, cursor):
+        return self.get_page(cursor)
+
+    def _page_after(self, position):
+        queryset = self.ordered_list
+        if position is not None:
+            date, pk = position
+            queryset = queryset.filter(
+                Q(**{f'{self.date_field}__lt': date})
+                | Q(**{self.date_field: date, f'{self.pk_field}__lt': pk})
+            )
+        items = list(queryset[:self.per_page + 1])
+        has_next = len(items) > self.per_page
+        items = items[:self.per_page]
+        return CursorPage(
+            items, self,
+            next_cursor=(self.encode_cursor(items[-1])
+                         if has_next else None),
+            previous_cursor=(self.encode_cursor(items[0], reverse=True)
+                             if position is not None and items else None),
+        )
+
+    def _page_before(self, date, pk):
+        queryset = self.ordered_list.filter(
+            Q(**{f'{self.date_field}__gt': date})
+            | Q(**{self.date_field: date, f'{self.pk_field}__gt': pk})
+        ).reverse()
+        items = list(queryset[:self.per_page + 1])
+        has_previous = len(items) > self.per_page
+        items = items[:self.per_page][::-1]
+        if not items:
+            return self._page_after(None)
+        return CursorPage(
+            items, self,
+            next_cursor=self.encode_cursor(items[-1]),
+            previous_cursor=(self.encode_cursor(items[0], reverse=True)
+                             if has_previous else None),
+        )
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator с оценкой числа объектов вместо точного COUNT(*).
+
+    Для таблицы без фильтров число строк оценивается по максимальному id,
+    для выборки с фильтрами — считается не дальше count_limit.
+    """
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.has_filters():
+            return queryset.aggregate(total=Max('pk'))['total'] or 0
+        return len(queryset.order_by().values_list('pk', flat=True)[
+            :self.count_limit
+        ])
+
+
+def paginate(request, object_list, per_page=PER_PAGE, cursor=False,
+             count=None, cursor_fields=None):
+    """Страница ленты: курсорная, если запрошен ``?cursor=``, иначе по номеру.
+
+    ``cursor=True`` включает курсорный режим независимо от запроса.
+    ``count`` — заранее известное число объектов (например, из счетчика),
+    избавляет постраничный режим от COUNT(*).
+    ``cursor_fields`` — поля даты и id курсора (см. CursorPaginator).
+    """
+    if cursor or 'cursor' in request.GET:
+        paginator = CursorPaginator(object_list, per_page, cursor_fields)
+        return paginator.get_page(request.GET.get('cursor'))
+    paginator = Paginator(object_list, per_page)
+    if count is not None:
+        paginator.count = count
+    return paginator.get_page(request.GET.get('page'))
@@ -0,0 +1,70 @@
+"""Сброс страниц в CDN или обратном прокси по суррогатным ключам.
+
+Кэшируемые ответы помечаются заголовком Surrogate-Key, а при изменении
+данных purge() передает затронутые ключи бэкенду из
+settings.EDGE_PURGE_BACKEND:
+
+* DummyPurgeBackend — ничего не делает (прокси не настроен);
+* LocmemPurgeBackend — складывает ключи в purge.outbox, для тестов;
+* HttpPurgeBackend — отправляет запрос EDGE_PURGE_METHOD на
+  EDGE_PURGE_URL с ключами в заголовке Surrogate-Key (Varnish xkey,
+  Fastly и совместимые).
+"""
+import logging
+from functools import lru_cache
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Ключи, сброшенные LocmemPurgeBackend, по одному списку на вызов.
+outbox = []
+
+
+class DummyPurgeBackend:
+    def purge(self, keys):
+        pass
+
+
+class LocmemPurgeBackend:
+    def purge(self, keys):
+        outbox.append(sorted(keys))
+
+
+class HttpPurgeBackend:
+    timeout = 2
+
+    def purge(self, keys):
+        try:
+            response = requests.request(
+                settings.EDGE_PURGE_METHOD,
+                settings.EDGE_PURGE_URL,
+                headers={'Surrogate-Key': ' '.join(keys)},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except requests.RequestException:
+            # Страница останется в кэше до истечения s-maxage.
+            logger.exception('Не удалось сбросить ключи %s', keys)
+
+
+@lru_cache(maxsize=None)
+def _get_backend(path):
+    return import_string(path)()
+
+
+def get_backend():
+    return _get_backend(settings.EDGE_PURGE_BACKEND)
+
+
+def purge(*keys, using=None):
+    """Сбрасывает ключи после фиксации транзакции базы ``using``.
+
+    Раньше нельзя: прокси успел бы закэшировать старые данные заново.
+    """
+    if keys:
+        transaction.on_commit(lambda: get_backend().purge(keys),
+                              using=using)
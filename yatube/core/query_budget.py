@@ -0,0 +1,92 @@
+"""Бюджеты SQL-запросов представлений.
+
+Бюджет задается декоратором ``@query_budget(n)``; словарь
+settings.QUERY_BUDGETS по имени представления ('posts:main': n)
+переопределяет его.
+MetricsMiddleware уже считает запросы каждого ответа; если их больше
+бюджета, то:
+
+* в тестах (QUERY_BUDGET_RAISE, включают core.test_runner и
+  tests/conftest.py для py.test) запрос падает с QueryBudgetExceeded —
+  N+1 в ленте ломает сборку;
+* в работе доля QUERY_BUDGET_LOG_SAMPLE таких ответов пишется в лог.
+
+В отчете — повторяющиеся запросы с подставленными «?» вместо значений
+и места в коде, откуда пришли запросы сверх бюджета.
+"""
+import logging
+import random
+import re
+import traceback
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STACK_DEPTH = 4
+REPORT_QUERIES = 5
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(limit):
+    """Задает бюджет SQL-запросов представления."""
+    def decorator(view):
+        view.query_budget = limit
+        return view
+    return decorator
+
+
+def get_budget(request):
+    """Бюджет представления запроса или None, если он не задан."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    # Настройки важнее декоратора: бюджет можно поправить без кода.
+    if match.view_name in settings.QUERY_BUDGETS:
+        return settings.QUERY_BUDGETS[match.view_name]
+    return getattr(match.func, 'query_budget', None)
+
+
+def stack_summary():
+    """Последние кадры стека из кода проекта, без библиотек."""
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(settings.BASE_DIR)
+        and 'site-packages' not in frame.filename
+    ]
+    return ' <- '.join(
+        f'{frame.filename[len(settings.BASE_DIR) + 1:]}:{frame.lineno} '
+        f'{frame.name}'
+        for frame in reversed(frames[-STACK_DEPTH:])
+    )
+
+
+def normalize(sql):
+    return LITERAL_RE.sub('?', sql)
+
+
+def report(view_name, budget, queries, stacks):
+    repeated = Counter(normalize(sql) for sql in queries).most_common(
+        REPORT_QUERIES
+    )
+    lines = [f'{view_name}: {len(queries)} SQL-запросов при бюджете '
+             f'{budget}']
+    lines += [f'  {count} x {sql}' for sql, count in repeated]
+    lines += ['  сверх бюджета:'] + [f'    {stack}'
+                                     for stack in sorted(set(stacks))]
+    return '\n'.join(lines)
+
+
+def check(view_name, budget, queries, stacks):
+    """Сообщает о превышении бюджета: исключение в тестах, лог в работе."""
+    if budget is None or len(queries) <= budget:
+        return
+    if settings.QUERY_BUDGET_RAISE:
+        raise QueryBudgetExceeded(report(view_name, budget, queries, stacks))
+    if random.random() < settings.QUERY_BUDGET_LOG_SAMPLE:
+        logger.warning(report(view_name, budget, queries, stacks))
@@ -0,0 +1,95 @@
+"""Чтение из реплики базы.
+
+Представления, отмеченные @read_replica, читают из alias REPLICA; все
+остальное, включая любые записи, идет в основную базу. Реплика
+отстает, поэтому после записи пользователь на REPLICA_PIN_SECONDS
+«прикалывается» к основной базе (cookie ставит ReplicaPinMiddleware)
+и сразу видит свой пост или комментарий.
+
+Если реплика не настроена (alias смотрит в тот же файл, что и
+основная база, как в тестах), роутер всегда выбирает основную базу.
+"""
+import time
+from contextvars import ContextVar
+from functools import partial, wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+PIN_COOKIE = 'replica_pin'
+
+_reading = ContextVar('replica_reading', default=False)
+_wrote = ContextVar('replica_wrote', default=None)
+
+
+def configured():
+    databases = connections.databases
+    return REPLICA in databases and (
+        databases[REPLICA]['NAME'] != databases[DEFAULT_DB_ALIAS]['NAME']
+    )
+
+
+def is_pinned(request):
+    """Писал ли пользователь недавно (cookie еще не истекла)."""
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_replica(view=None, *, recent=None):
+    """Представление читает из реплики, если пользователь не прикреплен
+    к основной базе.
+
+    ``recent(request, *args, **kwargs)`` сообщает, что показанные
+    данные только что менялись и реплика могла их еще не получить.
+    """
+    if view is None:
+        return partial(read_replica, recent=recent)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not configured() or is_pinned(request) or (
+            recent is not None and recent(request, *args, **kwargs)
+        ):
+            return view(request, *args, **kwargs)
+        token = _reading.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _reading.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _reading.get() and configured():
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        wrote = _wrote.get()
+        if wrote is not None:
+            wrote.append(model)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, REPLICA}
+        return obj1._state.db in aliases and obj2._state.db in aliases
+
+
+def track_writes(request, get_response):
+    """Выполняет запрос; если он писал в базу, прикрепляет пользователя
+    к основной базе."""
+    wrote = []
+    token = _wrote.set(wrote)
+    try:
+        response = get_response(request)
+    finally:
+        _wrote.reset(token)
+    if wrote and configured():
+        window = settings.REPLICA_PIN_SECONDS
+        response.set_cookie(PIN_COOKIE, str(int(time.time() + window)),
+                            max_age=window, httponly=True, samesite='Lax')
+    return response
@@ -0,0 +1,44 @@
+from django.core.cache.utils import make_template_fragment_key
+from django.template import Library, Node, TemplateSyntaxError
+
+from ..cache import fragment_cache, get_or_recompute
+
+register = Library()
+
+
+class SingleFlightCacheNode(Node):
+    def __init__(self, nodelist, expire_time_var, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.expire_time_var = expire_time_var
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        expire_time = self.expire_time_var.resolve(context)
+        if expire_time is not None:
+            expire_time = int(expire_time)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        cache_key = make_template_fragment_key(self.fragment_name, vary_on)
+        return get_or_recompute(cache_key,
+                                lambda: self.nodelist.render(context),
+                                expire_time, cache=fragment_cache())
+
+
+@register.tag('singleflight_cache')
+def do_singleflight_cache(parser, token):
+    """Аналог {% cache %}, который пересчитывает фрагмент в одном воркере
+    и обновляет его заранее, до истечения срока.
+
+    {% singleflight_cache [expire_time] [fragment_name] [var1] .. %}
+    """
+    nodelist = parser.parse(('endsingleflight_cache',))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise TemplateSyntaxError(
+            f'{tokens[0]!r} tag requires at least 2 arguments.'
+        )
+    return SingleFlightCacheNode(
+        nodelist, parser.compile_filter(tokens[1]), tokens[2],
+        [parser.compile_filter(var) for var in tokens[3:]],
+    )
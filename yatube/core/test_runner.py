@@ -0,0 +1,38 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Запускает тесты с обязательными бюджетами SQL-запросов.
+
+    Версии картинок создаются сразу (как и в pytest, см.
+    tests/conftest.py): фоновый поток не должен писать во временный
+    MEDIA_ROOT теста после его удаления.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_RAISE = True
+        settings.THUMBNAIL_WORKERS = 0
+
+
+@contextmanager
+def on_commit_callbacks(using=DEFAULT_DB_ALIAS):
+    """Выполняет on_commit-колбэки, накопленные внутри блока.
+
+    TestCase никогда не фиксирует свою транзакцию, поэтому без этого
+    инвалидация кэшей и очистка CDN в тестах не срабатывают
+    (аналог captureOnCommitCallbacks из новых версий Django).
+    """
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    yield
+    # Колбэк может сам отложить следующий — выполняем до опустошения.
+    while len(connection.run_on_commit) > start:
+        callbacks = connection.run_on_commit[start:]
+        del connection.run_on_commit[start:]
+        for _, callback in callbacks:
+            callback()
@@ -1,5 +1,24 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import feed_cache
+from posts.models import Post
+
+from . import metrics, replicas
+from .backends.sqlite3.base import DatabaseWrapper
+from .cache import get_or_recompute
+from .query_budget import QueryBudgetExceeded, normalize
+from .test_runner import on_commit_callbacks
 
 User = get_user_model()
 
@@ -13,3 +32,236 @@ class ViewTestClass(TestCase):
         response = self.guest_client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class SingleFlightCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_value_computed_once(self):
+        """Значение вычисляется один раз и берется из кэша."""
+        get_or_recompute('key', self.compute, 60)
+        self.assertEqual(get_or_recompute('key', self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_while_other_worker_recomputes(self):
+        """Пока другой воркер пересчитывает ключ, отдается старое значение."""
+        cache.set('key', ('old', 1, time.time() - 1), 60)
+        cache.add('key:lock', 1)
+        self.assertEqual(get_or_recompute('key', self.compute, 60), 'old')
+        self.assertEqual(self.calls, 0)
+
+    def test_early_refresh_near_expiry(self):
+        """Ключ у самого истечения обновляется заранее."""
+        cache.set('key', ('old', 60, time.time() + 1), 60)
+        self.assertEqual(get_or_recompute('key', self.compute, 60,
+                                          beta=1000), 1)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+
+    def test_request_recorded(self):
+        """Запрос попадает в гистограммы своего представления."""
+        self.client.get(reverse('posts:main'))
+        self.client.get(reverse('posts:main'))
+        stats = metrics.snapshot()['posts:main']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(sum(stats['request_duration']['buckets']), 2)
+        self.assertGreater(stats['db_queries']['sum'], 0)
+        self.assertGreater(stats['template_duration']['sum'], 0)
+        self.assertEqual(stats['cache_misses'], 1)
+        self.assertEqual(stats['cache_hits'], 1)
+
+    def test_prometheus_endpoint(self):
+        self.client.get(reverse('posts:main'))
+        response = self.client.get(reverse('metrics'))
+        self.assertContains(
+            response,
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:main",le="+Inf"} 1',
+        )
+        self.assertContains(response,
+                            'yatube_cache_misses_total{view="posts:main"} 1')
+
+    def test_endpoint_hidden_from_public(self):
+        response = self.client.get(reverse('metrics'),
+                                   REMOTE_ADDR='203.0.113.1')
+        self.assertEqual(response.status_code, 404)
+
+    def test_slow_views_command(self):
+        self.client.get(reverse('posts:main'))
+        out = StringIO()
+        call_command('slow_views', stdout=out)
+        self.assertIn('posts:main', out.getvalue())
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='budget')
+        self.client.force_login(self.user)
+
+    @override_settings(QUERY_BUDGETS={'posts:main': 0},
+                       QUERY_BUDGET_RAISE=True)
+    def test_exceeded_budget_raises(self):
+        """Сверх бюджета запрос падает с отчетом о запросах."""
+        with self.assertRaises(QueryBudgetExceeded) as raised:
+            self.client.get(reverse('posts:main'))
+        report = str(raised.exception)
+        self.assertIn('posts:main', report)
+        self.assertIn('SELECT', report)
+        self.assertIn('сверх бюджета', report)
+
+    @override_settings(QUERY_BUDGETS={'posts:main': 0},
+                       QUERY_BUDGET_RAISE=False, QUERY_BUDGET_LOG_SAMPLE=1)
+    def test_exceeded_budget_logged(self):
+        """Без QUERY_BUDGET_RAISE превышение пишется в лог."""
+        with self.assertLogs('core.query_budget', 'WARNING'):
+            response = self.client.get(reverse('posts:main'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_views_within_budget(self):
+        """Ленты укладываются в бюджеты, заданные декоратором."""
+        for url in (reverse('posts:main'), reverse('api:index'),
+                    reverse('posts:profile', args=[self.user.username])):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_normalize_literals(self):
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE id = 12 AND s = 'a''b'"),
+            'SELECT * FROM t WHERE id = ? AND s = ?',
+        )
+
+
+class SqliteProfileTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, directory)
+        self.name = os.path.join(directory, 'db.sqlite3')
+        self.addCleanup(lambda: os.path.exists(self.name)
+                        and os.remove(self.name))
+
+    def connect(self, **settings_dict):
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict, 'NAME': self.name, **settings_dict,
+        }, alias='profile')
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        return wrapper.connection.execute(f'PRAGMA {name}').fetchone()[0]
+
+    def test_pragmas_applied_on_connect(self):
+        """Прагмы из PRAGMAS выполняются при каждом подключении."""
+        wrapper = self.connect(PRAGMAS={
+            'journal_mode': 'WAL', 'synchronous': 'NORMAL',
+            'cache_size': -4000, 'busy_timeout': 1234,
+        })
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -4000)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 1234)
+
+    def test_without_pragmas_defaults_kept(self):
+        wrapper = self.connect()
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'delete')
+
+    def test_immediate_transactions(self):
+        """TRANSACTION_MODE меняет BEGIN транзакций."""
+        for mode, expected in ((None, 'BEGIN'),
+                               ('IMMEDIATE', 'BEGIN IMMEDIATE')):
+            with self.subTest(mode=mode):
+                wrapper = self.connect(TRANSACTION_MODE=mode)
+                executed = []
+
+                def capture(execute, sql, params, many, context):
+                    executed.append(sql)
+                    return execute(sql, params, many, context)
+
+                with wrapper.execute_wrapper(capture):
+                    wrapper._start_transaction_under_autocommit()
+                wrapper.connection.rollback()
+                self.assertEqual(executed, [expected])
+
+
+class ReplicaTests(TestCase):
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        # Реплика — отдельный файл SQLite со схемой, но без данных:
+        # так выглядит реплика, которая еще не получила записи.
+        cls.directory = tempfile.mkdtemp()
+        replica = connections[replicas.REPLICA]
+        cls.mirror_name = replica.settings_dict['NAME']
+        replica.close()
+        replica.settings_dict['NAME'] = os.path.join(cls.directory,
+                                                     'replica.sqlite3')
+        call_command('migrate', database=replicas.REPLICA, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        replica = connections[replicas.REPLICA]
+        replica.close()
+        replica.settings_dict['NAME'] = cls.mirror_name
+        shutil.rmtree(cls.directory)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.age_feeds()
+
+    def age_feeds(self):
+        # Ленты давно не менялись: реплика успела бы их догнать.
+        for scope in (feed_cache.GLOBAL, feed_cache.INDEX):
+            feed_cache.version(scope)
+            cache.set(feed_cache._modified_key(scope), time.time() - 3600,
+                      None)
+
+    def index_posts(self, client):
+        response = client.get(reverse('posts:main'))
+        return list(response.context['page_obj'])
+
+    def test_feed_read_from_replica(self):
+        """Лента читается из реплики, которая еще пуста."""
+        self.assertTrue(replicas.configured())
+        self.assertEqual(self.index_posts(self.client), [])
+
+    def test_recently_changed_feed_read_from_primary(self):
+        """Ленту, изменившуюся за время отставания, читают из основной."""
+        with on_commit_callbacks():
+            feed_cache.bump(feed_cache.INDEX)
+        self.assertEqual(self.index_posts(self.client), [self.post])
+
+    def test_write_pins_user_to_primary(self):
+        """После записи пользователь читает из основной базы."""
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'},
+        )
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        self.age_feeds()
+        self.assertEqual(self.index_posts(self.client), [self.post])
+        self.assertEqual(self.index_posts(Client()), [])
+
+    def test_writes_go_to_primary(self):
+        router = replicas.ReplicaRouter()
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertEqual(router.db_for_read(Post), 'default')
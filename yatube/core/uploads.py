@@ -0,0 +1,35 @@
+"""Загрузка файлов с ограниченным расходом памяти.
+
+Все загружаемые файлы пишутся во временный файл на диске частями по
+chunk_size (64 КБ), в памяти одновременно держится только одна часть.
+После UPLOAD_MAX_FILE_SIZE байт запись прекращается, а файл помечается
+атрибутом ``exceeded`` — форма отклоняет его с понятной ошибкой.
+"""
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file.exceeded = False
+        self.written = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.written + len(raw_data) > settings.UPLOAD_MAX_FILE_SIZE:
+            # Остаток файла дочитывается из запроса, но не сохраняется.
+            self.file.exceeded = True
+            return None
+        self.file.write(raw_data)
+        self.written += len(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = self.written
+        return self.file
+
+
+def exceeded(upload):
+    """True, если файл был обрезан из-за UPLOAD_MAX_FILE_SIZE."""
+    return getattr(upload, 'exceeded', False)
@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from . import metrics
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию;
@@ -17,3 +21,12 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+def metrics_view(request):
+    """Метрики в формате Prometheus для внутренних адресов и персонала."""
+    if not (request.META.get('REMOTE_ADDR') in settings.INTERNAL_IPS
+            or request.user.is_staff):
+        raise Http404
+    return HttpResponse(metrics.render_prometheus(metrics.collect()),
+                        content_type='text/plain; version=0.0.4')
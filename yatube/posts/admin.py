@@ -1,6 +1,24 @@
+from core.paginators import EstimatedCountPaginator
 from django.contrib import admin
 
-from .models import Comment, Follow, Group, Post
+from . import search
+from .models import (Comment, CommentSearchEntry, Follow, Group, Post,
+                     SearchEntry)
+
+
+class IndexedSearchAdmin(admin.ModelAdmin):
+    """Поиск в списке объектов по полнотекстовому индексу вместо LIKE."""
+    search_entry_model = None
+    search_entry_field = None
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        matches = search.matching(self.search_entry_model,
+                                  self.search_entry_field, search_term)
+        return queryset.filter(pk__in=matches), False
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -9,16 +27,22 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(IndexedSearchAdmin):
+    search_entry_model = SearchEntry
+    search_entry_field = 'post'
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
     list_editable = ('group',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(IndexedSearchAdmin):
+    search_entry_model = CommentSearchEntry
+    search_entry_field = 'comment'
     list_display = ('pk', 'text', 'pub_date', 'author')
+    list_select_related = ('author',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
@@ -0,0 +1,78 @@
+"""JSON API лент и постов (только чтение).
+
+Ленты отдаются страницами курсорного пагинатора из core.paginators, тем
+же, что и HTML-ленты. ETag и Last-Modified добавляет
+posts.conditional, как и у HTML-страниц.
+"""
+from core.paginators import PER_PAGE, CursorPaginator
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, permissions
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from . import shards, timeline
+from .models import Group, Post, User
+from .serializers import PostSerializer
+
+
+class FeedPagination(BasePagination):
+    page_size = PER_PAGE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        paginator = CursorPaginator(queryset, self.page_size,
+                                    getattr(view, 'cursor_fields', None))
+        self.page = paginator.get_page(request.query_params.get('cursor'))
+        return list(self.page)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   'cursor', cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.page.next_cursor),
+            'previous': self.get_link(self.page.previous_cursor),
+            'results': data,
+        })
+
+
+class FeedView(generics.ListAPIView):
+    serializer_class = PostSerializer
+    pagination_class = FeedPagination
+
+
+class IndexFeed(FeedView):
+    def get_queryset(self):
+        return shards.across(Post.objects.for_feed())
+
+
+class GroupFeed(FeedView):
+    def get_queryset(self):
+        group = get_object_or_404(Group, slug=self.kwargs['slug'])
+        return shards.across(group.posts.for_feed())
+
+
+class ProfileFeed(FeedView):
+    def get_queryset(self):
+        author = get_object_or_404(User, username=self.kwargs['username'])
+        return author.posts.for_feed()
+
+
+class FollowFeed(FeedView):
+    permission_classes = [permissions.IsAuthenticated]
+    cursor_fields = timeline.CURSOR_FIELDS
+
+    def get_queryset(self):
+        return timeline.feed(self.request.user).for_feed()
+
+
+class PostDetail(generics.RetrieveAPIView):
+    serializer_class = PostSerializer
+    lookup_url_kwarg = 'post_id'
+
+    def get_queryset(self):
+        return Post.objects.for_feed().shard_of(self.kwargs['post_id'])
@@ -0,0 +1,36 @@
+from core.query_budget import query_budget
+from django.urls import path
+
+from . import api
+from .conditional import (conditional, follow_scopes, group_keys,
+                          group_scopes, index_scopes, post_keys, post_scopes,
+                          profile_scopes)
+
+app_name = 'api'
+
+urlpatterns = [path('posts/',
+                    query_budget(4)(conditional(index_scopes)(
+                        api.IndexFeed.as_view()
+                    )),
+                    name='index'),
+               path('group/<slug:slug>/',
+                    query_budget(6)(conditional(group_scopes, group_keys)(
+                        api.GroupFeed.as_view()
+                    )),
+                    name='group'),
+               path('profile/<str:username>/',
+                    query_budget(6)(conditional(profile_scopes)(
+                        api.ProfileFeed.as_view()
+                    )),
+                    name='profile'),
+               path('follow/',
+                    query_budget(5)(conditional(follow_scopes)(
+                        api.FollowFeed.as_view()
+                    )),
+                    name='follow'),
+               path('posts/<int:post_id>/',
+                    query_budget(5)(conditional(post_scopes, post_keys)(
+                        api.PostDetail.as_view()
+                    )),
+                    name='post_detail'),
+               ]
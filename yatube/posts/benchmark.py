@@ -0,0 +1,354 @@
+"""Нагрузочный замер представлений posts.
+
+seed() заполняет базу синтетическими данными через mixer: популярность
+авторов, групп и постов распределена по Ципфу, как в настоящих соцсетях
+(немного звезд и длинный хвост). Данные пишутся пачками через
+bulk_create, а денормализованные таблицы (ленты подписок, счетчики,
+поисковый индекс) затем пересобираются целиком.
+
+run() прогоняет каждое представление из posts.urls через тестовый
+клиент и возвращает перцентили времени ответа, пропускную способность
+и число SQL-запросов; concurrency() нагружает ленты и комментарии
+одновременно из нескольких потоков. Результат — словарь, который
+команда benchmark пишет в JSON, чтобы сравнивать прогоны разных
+коммитов и профилей базы.
+"""
+import copy
+import math
+import random
+import time
+from threading import Thread
+
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.urls import get_resolver, reverse
+from mixer.backend.django import Mixer
+
+from . import counters, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+SKEW = 1.1
+PERCENTILES = (50, 90, 95, 99)
+REPLY_SHARE = 0.3
+# Одновременная нагрузка: ленты читают, комментарии пишут.
+CONCURRENT_READS = ('posts:main', 'posts:group_detail', 'posts:profile',
+                    'posts:follow_index')
+CONCURRENT_WRITES = ('posts:add_comment',)
+
+
+def zipf_weights(count, skew=SKEW):
+    """Веса рангов 1..count: первый самый популярный."""
+    return [1 / rank ** skew for rank in range(1, count + 1)]
+
+
+def _chunks(objs, size=500):
+    for start in range(0, len(objs), size):
+        yield objs[start:start + size]
+
+
+def seed(users=200, groups=20, posts=5000, comments=10000,
+         follows_per_user=20, seed=0):
+    """Заполняет базу синтетическими данными; возвращает их объемы."""
+    rng = random.Random(seed)
+    mixer = Mixer(commit=False)
+    mixer.faker.seed(seed)
+
+    user_objs = [mixer.blend(User, username=f'user{number}')
+                 for number in range(users)]
+    for user in user_objs:
+        # save() вызывает сигнал, создающий профиль.
+        user.save()
+    Group.objects.bulk_create(
+        mixer.blend(Group, slug=f'group{number}')
+        for number in range(groups)
+    )
+    group_objs = list(Group.objects.order_by('pk'))
+
+    author_weights = zipf_weights(users)
+    follow_objs = []
+    for user in user_objs:
+        authors = {
+            author.pk for author in rng.choices(
+                user_objs, author_weights,
+                k=min(follows_per_user, users - 1),
+            )
+            if author.pk != user.pk
+        }
+        follow_objs += [Follow(user=user, author_id=author)
+                        for author in authors]
+    for chunk in _chunks(follow_objs):
+        Follow.objects.bulk_create(chunk)
+
+    group_weights = zipf_weights(groups)
+    post_objs = [
+        mixer.blend(
+            Post,
+            author=rng.choices(user_objs, author_weights)[0],
+            group=(rng.choices(group_objs, group_weights)[0]
+                   if rng.random() < 0.7 else None),
+            image='',
+        )
+        for _ in range(posts)
+    ]
+    for chunk in _chunks(post_objs):
+        Post.objects.bulk_create(chunk)
+
+    # SQLite не возвращает pk из bulk_create: берем их из базы.
+    post_ids = list(Post.objects.order_by('pk').values_list('pk', flat=True))
+    post_weights = zipf_weights(len(post_ids))
+    roots = int(comments * (1 - REPLY_SHARE))
+    comment_objs = [
+        mixer.blend(Comment, post=Post(pk=post_id),
+                    author=rng.choice(user_objs), parent=None)
+        for post_id in rng.choices(post_ids, post_weights, k=roots)
+    ]
+    for chunk in _chunks(comment_objs):
+        Comment.objects.bulk_create(chunk)
+    root_comments = list(Comment.objects.values_list('pk', 'post_id'))
+    reply_objs = [
+        mixer.blend(Comment, post=Post(pk=post_id),
+                    parent=Comment(pk=parent_id, post_id=post_id),
+                    author=rng.choice(user_objs))
+        for parent_id, post_id in rng.choices(root_comments,
+                                              k=comments - roots)
+    ] if root_comments else []
+    for chunk in _chunks(reply_objs):
+        Comment.objects.bulk_create(chunk)
+
+    timeline.rebuild()
+    counters.recount_profiles()
+    counters.recount_posts()
+    search.rebuild()
+    return {
+        'users': User.objects.count(),
+        'groups': Group.objects.count(),
+        'posts': Post.objects.count(),
+        'comments': Comment.objects.count(),
+        'follows': Follow.objects.count(),
+    }
+
+
+class Dataset:
+    """Объекты, на которых запускаются сценарии: самые популярные
+    автор, группа и пост и читатель с самой большой лентой."""
+
+    def __init__(self):
+        self.author = User.objects.order_by('-profile__followers_count',
+                                            'pk').first()
+        self.reader = User.objects.order_by('-profile__following_count',
+                                            'pk').first()
+        self.group = Group.objects.order_by('pk').first()
+        self.post = Post.objects.order_by('-comments_count', 'pk').first()
+        self.reader_post = Post.objects.filter(author=self.reader).first()
+        if self.reader_post is None:
+            self.reader_post = Post.objects.create(author=self.reader,
+                                                   text='Пост читателя')
+        words = search.WORD_RE.findall(self.post.text)
+        self.query = words[0] if words else 'пост'
+        followed = Follow.objects.filter(user=self.reader).values('author')
+        self.strangers = list(
+            User.objects.exclude(pk__in=followed).exclude(pk=self.reader.pk)
+            .order_by('pk')
+        ) or [self.author]
+        self.anonymous = Client()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def stranger(self, number):
+        return self.strangers[number % len(self.strangers)]
+
+
+# Сценарии по именам адресов posts.urls: (клиент, метод, адрес, данные).
+# Изменяющие сценарии идут последними, чтобы не сбрасывать кэш лент
+# перед замером чтения.
+SCENARIOS = {
+    'posts:main': lambda data, number: (
+        data.anonymous, 'get', reverse('posts:main'), None),
+    'posts:group_detail': lambda data, number: (
+        data.anonymous, 'get',
+        reverse('posts:group_detail', args=[data.group.slug]), None),
+    'posts:profile': lambda data, number: (
+        data.anonymous, 'get',
+        reverse('posts:profile', args=[data.author.username]), None),
+    'posts:search': lambda data, number: (
+        data.anonymous, 'get', reverse('posts:search'), {'q': data.query}),
+    'posts:post_detail': lambda data, number: (
+        data.anonymous, 'get',
+        reverse('posts:post_detail', args=[data.post.pk]), None),
+    'posts:post_comments': lambda data, number: (
+        data.anonymous, 'get',
+        reverse('posts:post_comments', args=[data.post.pk]), None),
+    'posts:follow_index': lambda data, number: (
+        data.client, 'get', reverse('posts:follow_index'), None),
+    'posts:post_create': lambda data, number: (
+        data.client, 'post', reverse('posts:post_create'),
+        {'text': f'Новый пост {number}', 'group': data.group.pk}),
+    'posts:post_edit': lambda data, number: (
+        data.client, 'post',
+        reverse('posts:post_edit', args=[data.reader_post.pk]),
+        {'text': f'Исправленный пост {number}'}),
+    'posts:add_comment': lambda data, number: (
+        data.client, 'post',
+        reverse('posts:add_comment', args=[data.post.pk]),
+        {'text': f'Комментарий {number}'}),
+    'posts:profile_follow': lambda data, number: (
+        data.client, 'get',
+        reverse('posts:profile_follow',
+                args=[data.stranger(number).username]), None),
+    'posts:profile_unfollow': lambda data, number: (
+        data.client, 'get',
+        reverse('posts:profile_unfollow',
+                args=[data.stranger(number).username]), None),
+}
+
+
+def uncovered_views():
+    """Адреса posts.urls без сценария."""
+    names = {
+        f'posts:{pattern.name}'
+        for pattern in get_resolver('posts.urls').url_patterns
+    }
+    return sorted(names - set(SCENARIOS))
+
+
+def percentile(samples, q):
+    """Перцентиль по рангу (nearest-rank) отсортированной выборки."""
+    rank = max(math.ceil(q / 100 * len(samples)), 1)
+    return samples[rank - 1]
+
+
+def measure(data, name, requests, warmup):
+    scenario = SCENARIOS[name]
+    queries = 0
+
+    def count(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    for number in range(warmup):
+        client, method, url, payload = scenario(data, number)
+        getattr(client, method)(url, payload)
+    durations = []
+    statuses = set()
+    with connection.execute_wrapper(count):
+        for number in range(warmup, warmup + requests):
+            client, method, url, payload = scenario(data, number)
+            start = time.perf_counter()
+            response = getattr(client, method)(url, payload)
+            durations.append(time.perf_counter() - start)
+            statuses.add(response.status_code)
+    durations.sort()
+    total = sum(durations)
+    result = {
+        'requests': requests,
+        'statuses': sorted(statuses),
+        'mean_ms': total / requests * 1000,
+        'max_ms': durations[-1] * 1000,
+        'rps': requests / total if total else None,
+        'queries': queries / requests,
+    }
+    for q in PERCENTILES:
+        result[f'p{q}_ms'] = percentile(durations, q) * 1000
+    return result
+
+
+def run(requests=50, warmup=5, views=None, data=None):
+    """Замеряет сценарии; возвращает {имя адреса: результаты}."""
+    data = data or Dataset()
+    return {
+        name: measure(data, name, requests, warmup)
+        for name in SCENARIOS
+        if views is None or name in views
+    }
+
+
+class ThreadClient(Client):
+    """Клиент для потоков: ошибка представления остается ответом 500.
+
+    Обычный Client ловит исключения через общий сигнал
+    got_request_exception и поднимает их в любом потоке, который в этот
+    момент ждет ответа, — ошибки писателей достались бы читателям.
+    """
+
+    def store_exc_info(self, **kwargs):
+        pass
+
+
+def _thread_data(data):
+    """Копия набора со своими клиентами: Client не потокобезопасен."""
+    local = copy.copy(data)
+    local.anonymous = ThreadClient()
+    local.client = ThreadClient()
+    local.client.force_login(data.reader)
+    return local
+
+
+def _work(data, names, until, offset, results):
+    durations = []
+    errors = 0
+    number = offset
+    try:
+        data = _thread_data(data)
+        while time.perf_counter() < until:
+            client, method, url, payload = SCENARIOS[
+                names[number % len(names)]
+            ](data, number)
+            start = time.perf_counter()
+            response = getattr(client, method)(url, payload)
+            if response.status_code < 400:
+                durations.append(time.perf_counter() - start)
+            else:
+                # 500 — обычно «database is locked».
+                errors += 1
+            number += 1
+            # Как после настоящего запроса: без CONN_MAX_AGE соединение
+            # закрывается и следующий запрос подключается заново.
+            close_old_connections()
+    finally:
+        connection.close()
+    results.append((durations, errors))
+
+
+def _summary(runs, duration):
+    durations = sorted(sample for samples, _ in runs for sample in samples)
+    result = {
+        'requests': len(durations),
+        'errors': sum(errors for _, errors in runs),
+        'per_second': len(durations) / duration,
+    }
+    for q in PERCENTILES:
+        result[f'p{q}_ms'] = (percentile(durations, q) * 1000
+                              if durations else None)
+    return result
+
+
+def concurrency(readers=4, writers=2, duration=5.0, data=None):
+    """Читатели лент и писатели комментариев одновременно, в потоках.
+
+    Показывает, сколько чтения и записи база выдерживает вместе и
+    сколько запросов упало на блокировке.
+    """
+    data = data or Dataset()
+    until = time.perf_counter() + duration
+    reads, writes = [], []
+    threads = [
+        Thread(target=_work,
+               args=(data, CONCURRENT_READS, until, number * 1000, reads))
+        for number in range(readers)
+    ] + [
+        Thread(target=_work,
+               args=(data, CONCURRENT_WRITES, until, number * 1000, writes))
+        for number in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'readers': readers,
+        'writers': writers,
+        'duration': duration,
+        'reads': _summary(reads, duration),
+        'writes': _summary(writes, duration),
+    }
@@ -0,0 +1,144 @@
+"""Условные и кэшируемые ответы для лент и постов.
+
+Токен версии страницы (ETag / Last-Modified) собирается из версий лент
+feed_cache, которые сигналы сдвигают при любом изменении постов,
+комментариев, групп и подписок. Он вычисляется без шаблонов и запросов
+к постам, поэтому повторный запрос неизменившейся страницы получает
+дешевый 304.
+
+Страницы для анонимных пользователей разрешено хранить в CDN: они
+помечаются теми же лентами как суррогатными ключами и сбрасываются
+вместе с версиями (core.purge). Страницы поста и группы несут еще и
+собственные ключи (feed_cache.post_key, feed_cache.group_key).
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import feed_cache
+from .models import Group, Post, User
+
+
+def _pk(queryset, field, **lookup):
+    return queryset.filter(**lookup).values_list(field, flat=True).first()
+
+
+def index_scopes(request):
+    return [feed_cache.INDEX]
+
+
+def group_scopes(request, slug):
+    return [feed_cache.group_scope(_pk(Group.objects, 'pk', slug=slug))]
+
+
+def group_keys(request, slug):
+    return [feed_cache.group_key(slug)]
+
+
+def profile_scopes(request, username):
+    # Кроме постов, профиль показывает счетчики подписок автора
+    # и кнопку подписки читателя.
+    author_id = _pk(User.objects, 'pk', username=username)
+    scopes = [feed_cache.author_scope(author_id),
+              feed_cache.follow_scope(author_id)]
+    if request.user.is_authenticated:
+        scopes.append(feed_cache.follow_scope(request.user.pk))
+    return scopes
+
+
+def follow_scopes(request):
+    # Лента подписок меняется с любым постом и с подписками читателя.
+    return [feed_cache.INDEX, feed_cache.follow_scope(request.user.pk)]
+
+
+def post_scopes(request, post_id):
+    # Ленты автора сдвигаются при правке поста, его комментариев
+    # и новых постах автора (их число показано на странице).
+    return [feed_cache.author_scope(
+        _pk(Post.objects.shard_of(post_id), 'author_id', pk=post_id)
+    )]
+
+
+def post_keys(request, post_id):
+    return [feed_cache.post_key(post_id)]
+
+
+def _request_scopes(scopes, request, **kwargs):
+    if not hasattr(request, '_feed_scopes'):
+        request._feed_scopes = scopes(request, **kwargs)
+    return request._feed_scopes
+
+
+def recently_changed(scopes):
+    """Для core.replicas.read_replica: менялись ли ленты страницы, пока
+    реплика могла отставать.
+
+    Такая страница читается из основной базы: иначе устаревший рендер
+    попал бы во фрагментный кэш под уже новой версией ленты.
+    """
+    def changed(request, *args, **kwargs):
+        modified = feed_cache.last_modified(
+            *_request_scopes(scopes, request, **kwargs)
+        )
+        return modified is None or (
+            time.time() - modified.timestamp()
+            < settings.REPLICA_PIN_SECONDS
+        )
+    return changed
+
+
+def conditional(scopes, keys=None):
+    """ETag, Last-Modified и заголовки кэширования по лентам ``scopes``.
+
+    ``scopes(request, **kwargs)`` возвращает ленты, от которых зависит
+    ответ; ``keys(request, **kwargs)`` — дополнительные суррогатные ключи
+    самой страницы. ETag учитывает также адрес запроса и пользователя, а для
+    вошедшего пользователя — его CSRF-токен: формы страницы несут токен,
+    и после входа в систему закэшированная страница с прежним не годится.
+    """
+    def get_scopes(request, **kwargs):
+        return _request_scopes(scopes, request, **kwargs)
+
+    def etag(request, **kwargs):
+        parts = [feed_cache.version(scope)
+                 for scope in get_scopes(request, **kwargs)]
+        parts += [request.get_full_path(), str(request.user.pk)]
+        if request.user.is_authenticated:
+            # get_token заводит токен, если cookie еще нет: ETag первого
+            # ответа совпадет с ETag следующих запросов с этой cookie.
+            get_token(request)
+            parts.append(request.META['CSRF_COOKIE'])
+        return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+    def last_modified(request, **kwargs):
+        return feed_cache.last_modified(*get_scopes(request, **kwargs))
+
+    def decorator(view):
+        view = condition(etag_func=etag,
+                         last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if response.status_code not in (200, 304):
+                return response
+            patch_vary_headers(response, ['Cookie'])
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+                return response
+            # Браузер каждый раз сверяет ETag, CDN хранит страницу
+            # до сброса по ключу.
+            patch_cache_control(response, public=True, max_age=0,
+                                s_maxage=settings.EDGE_CACHE_TIMEOUT)
+            response['Surrogate-Key'] = ' '.join([
+                feed_cache.GLOBAL, *get_scopes(request, **kwargs),
+                *(keys(request, **kwargs) if keys else ()),
+            ])
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,90 @@
+"""Денормализованные счетчики постов, комментариев и подписок.
+
+Счетчики меняются атомарным UPDATE с F-выражением, поэтому параллельные
+записи не теряют инкременты. Пересчет с нуля — команда recount_counters.
+
+При шардировании (posts.shards) посты и комментарии лежат не в базе
+профилей: число постов автора суммируется по шардам, а число
+комментариев пересчитывается в шарде каждого поста.
+"""
+from collections import Counter
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from users.models import Profile
+
+from . import shards
+from .models import Comment, Follow, Post, User
+
+
+def _bump(queryset, field, delta):
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def bump_profile(user_id, field, delta):
+    """Сдвигает счетчик профиля; профиль без строки пересчитывается."""
+    updated = _bump(Profile.objects.filter(user_id=user_id), field, delta)
+    if not updated and delta > 0:
+        recount_profiles(User.objects.filter(pk=user_id))
+
+
+def bump_post(post_id, delta):
+    _bump(Post.objects.shard_of(post_id).filter(pk=post_id),
+          'comments_count', delta)
+
+
+def _count(model, field, outer='pk'):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def _posts_counts(user_ids=None):
+    """Число постов авторов по всем шардам."""
+    posts = Post.objects.order_by()
+    if user_ids is not None:
+        posts = posts.filter(author_id__in=user_ids)
+    counts = Counter()
+    for queryset in shards.each(posts):
+        counts.update(dict(
+            queryset.values_list('author_id').annotate(total=Count('pk'))
+        ))
+    return counts
+
+
+def recount_profiles(users=None):
+    """Пересчитывает счетчики профилей, создавая недостающие."""
+    everyone = users is None
+    users = User.objects.all() if everyone else users
+    missing = users.filter(profile__isnull=True)
+    Profile.objects.bulk_create(
+        (Profile(user=user) for user in missing.iterator()),
+        ignore_conflicts=True,
+    )
+    profiles = Profile.objects.filter(user__in=users)
+    follows = {
+        'followers_count': _count(Follow, 'author', 'user'),
+        'following_count': _count(Follow, 'user', 'user'),
+    }
+    if not shards.enabled():
+        return profiles.update(posts_count=_count(Post, 'author', 'user'),
+                               **follows)
+    updated = profiles.update(posts_count=0, **follows)
+    counts = _posts_counts(
+        None if everyone else list(users.values_list('pk', flat=True))
+    )
+    for user_id, total in counts.items():
+        Profile.objects.filter(user_id=user_id).update(posts_count=total)
+    return updated
+
+
+def recount_posts(posts=None):
+    """Пересчитывает число комментариев у постов."""
+    posts = Post.objects.all() if posts is None else posts
+    # Подзапрос выполняется в той же базе, что и UPDATE, — в шарде поста.
+    return sum(queryset.update(comments_count=_count(Comment, 'post'))
+               for queryset in shards.each(posts))
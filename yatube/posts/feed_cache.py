@@ -0,0 +1,107 @@
+"""Версии кэшированных фрагментов лент.
+
+Версия входит в ключ фрагмента ({% cache %} ... feed_version), поэтому
+фрагменты можно хранить долго: любое изменение поста, комментария или
+группы сдвигает версию затронутых лент, и старые ключи просто
+перестают запрашиваться. Те же ленты служат суррогатными ключами
+страниц в CDN (core.purge): сдвиг версии сбрасывает и их.
+"""
+import time
+from datetime import datetime, timezone
+
+from core import purge
+from django.core.cache import cache
+from django.db import transaction
+
+GLOBAL = 'all'
+INDEX = 'index'
+
+KEY_PREFIX = 'feed-version'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def follow_scope(user_id):
+    """Подписки пользователя и подписки на него."""
+    return f'follow:{user_id}'
+
+
+# Ключи отдельных страниц для CDN (core.purge). Версий в кэше у них нет:
+# страницу поста или группы сбрасывают, не трогая соседние ленты.
+def post_key(post_id):
+    return f'post:{post_id}'
+
+
+def group_key(slug):
+    return f'group:{slug}'
+
+
+def _key(scope):
+    return f'{KEY_PREFIX}:{scope}'
+
+
+def _modified_key(scope):
+    return f'{KEY_PREFIX}:{scope}:modified'
+
+
+def version(scope):
+    """Строка версии ленты: глобальная версия плюс версия самой ленты."""
+    scopes = [GLOBAL, scope]
+    versions = cache.get_many([_key(scope) for scope in scopes])
+    for scope in scopes:
+        key = _key(scope)
+        if key not in versions:
+            # Начальное значение по времени: если версию вытеснили из кэша,
+            # новая не совпадет ни с одной из прежних.
+            now = time.time()
+            cache.add(key, int(now * 1000), timeout=None)
+            cache.add(_modified_key(scope), now, timeout=None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[_key(scope)]) for scope in scopes)
+
+
+def bump(*scopes, using=None):
+    """Инвалидирует фрагменты перечисленных лент после фиксации
+    транзакции базы ``using``.
+
+    Раньше нельзя: параллельный запрос увидел бы новую версию, отрисовал
+    незафиксированные данные и закэшировал бы их под ней на весь
+    FEED_CACHE_TIMEOUT, а ETag отвечал бы 304 на устаревшую страницу.
+    """
+    transaction.on_commit(lambda: _bump(scopes), using=using)
+
+
+def _bump(scopes):
+    cache.set_many({_modified_key(scope): time.time() for scope in scopes},
+                   timeout=None)
+    for scope in scopes:
+        try:
+            cache.incr(_key(scope))
+        except ValueError:
+            # Версии еще нет — значит, и фрагментов под ней нет.
+            pass
+    purge.purge(*scopes)
+
+
+def last_modified(*scopes):
+    """Время последнего изменения лент или None, если оно неизвестно."""
+    keys = [_modified_key(GLOBAL), *(_modified_key(s) for s in scopes)]
+    times = cache.get_many(keys)
+    if len(times) < len(keys):
+        return None
+    return datetime.fromtimestamp(max(times.values()), timezone.utc)
+
+
+def bump_post(post, group_ids=()):
+    """Инвалидирует ленты, в которых показан пост, и его страницу."""
+    group_ids = {post.group_id, *group_ids} - {None}
+    bump(INDEX, author_scope(post.author_id),
+         *(group_scope(group_id) for group_id in group_ids),
+         using=post._state.db)
+    purge.purge(post_key(post.pk), using=post._state.db)
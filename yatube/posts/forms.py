@@ -1,6 +1,11 @@
+from core.uploads import exceeded
 from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.template.defaultfilters import filesizeformat
 from django.utils.translation import gettext_lazy as _
 
+from . import renditions
 from .models import Comment, Post
 
 
@@ -15,6 +20,40 @@ class PostForm(forms.ModelForm):
             'image': _('Изображение')
         }
 
+    def clean_image(self):
+        """Отклоняет картинки с большим числом пикселей, уменьшает остальные.
+
+        Размер проверяется по заголовку: ImageField уже открыл картинку,
+        но не декодировал ее.
+        """
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile) or exceeded(image):
+            return image
+        width, height = image.image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                _('Изображение больше %(pixels)s мегапикселей.'),
+                params={'pixels': settings.POST_IMAGE_MAX_PIXELS // 10**6},
+                code='too_many_pixels',
+            )
+        return renditions.normalize(image)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload = self.files.get(self.add_prefix('image'))
+        if upload is not None and exceeded(upload):
+            # Обрезанный файл мог не пройти проверку ImageField: вместо
+            # «загрузите правильное изображение» сообщаем настоящую причину.
+            self.errors.pop('image', None)
+            self.add_error('image', forms.ValidationError(
+                _('Файл больше %(size)s.'),
+                params={'size': filesizeformat(
+                    settings.UPLOAD_MAX_FILE_SIZE
+                )},
+                code='file_too_large',
+            ))
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,196 @@
+import copy
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import uuid
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_databases,
+                               setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+
+from posts import benchmark
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Замеряет представления posts на синтетических данных во '
+            'временной базе и пишет результаты в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', metavar='JSON',
+                            help='результаты прошлого прогона для сравнения')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='замеров на представление')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--view', action='append', dest='views',
+                            help='имя адреса, например posts:main')
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--database-profile',
+                            choices=settings.DATABASE_PROFILES,
+                            help='профиль из DATABASE_PROFILES вместо '
+                                 'текущего DATABASES')
+        parser.add_argument('--readers', type=int, default=4,
+                            help='потоков, читающих ленты')
+        parser.add_argument('--writers', type=int, default=2,
+                            help='потоков, пишущих комментарии')
+        parser.add_argument('--duration', type=float, default=5,
+                            help='секунд одновременной нагрузки, 0 — '
+                                 'не замерять')
+
+    def handle(self, *args, **options):
+        unknown = set(options['views'] or ()) - set(benchmark.SCENARIOS)
+        if unknown:
+            raise CommandError(f'Нет сценариев: {", ".join(sorted(unknown))}')
+        for name in benchmark.uncovered_views():
+            self.stderr.write(f'Нет сценария для {name}')
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+
+        # Своя база и свой префикс ключей кэша: прогон не трогает ни
+        # рабочие данные, ни рабочий кэш. База — временный файл, а не
+        # память: иначе журнал и блокировки не похожи на настоящие.
+        # DEBUG выключен, как в работе: иначе время съедает
+        # debug_toolbar.
+        directory = tempfile.mkdtemp(prefix='benchmark-')
+        self.use_profile(options['database_profile'],
+                         os.path.join(directory, 'db.sqlite3'))
+        caches = {
+            alias: {**config, 'KEY_PREFIX': f'benchmark-{uuid.uuid4().hex}'}
+            for alias, config in settings.CACHES.items()
+        }
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(CACHES=caches, DEBUG=False):
+                dataset = benchmark.seed(
+                    users=options['users'], groups=options['groups'],
+                    posts=options['posts'], comments=options['comments'],
+                    follows_per_user=options['follows_per_user'],
+                    seed=options['seed'],
+                )
+                journal_mode = self.journal_mode()
+                data = benchmark.Dataset()
+                views = benchmark.run(options['requests'],
+                                      options['warmup'], options['views'],
+                                      data)
+                concurrency = None
+                if options['duration']:
+                    concurrency = benchmark.concurrency(
+                        options['readers'], options['writers'],
+                        options['duration'], data,
+                    )
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+            os.rmdir(directory)
+
+        results = {
+            'meta': {
+                'commit': git_commit(),
+                'created': datetime.now(timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'database_profile': options['database_profile'],
+                'journal_mode': journal_mode,
+                'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+                'cache': settings.CACHES['default']['BACKEND'],
+                'seed': options['seed'],
+                'dataset': dataset,
+                'requests': options['requests'],
+                'warmup': options['warmup'],
+            },
+            'views': views,
+            'concurrency': concurrency,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        self.report(views, baseline)
+        if concurrency:
+            self.report_concurrency(concurrency, baseline)
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты записаны в {options["output"]}'
+        ))
+
+    def report(self, views, baseline):
+        previous = baseline['views'] if baseline else {}
+        self.stdout.write(
+            f'{"представление":<26} {"p50, мс":>8} {"p95, мс":>8} '
+            f'{"p99, мс":>8} {"RPS":>7} {"SQL":>5}'
+            + (f' {"Δp50":>7} {"Δp95":>7}' if baseline else '')
+        )
+        for name, result in views.items():
+            line = (
+                f'{name:<26} {result["p50_ms"]:>8.1f} '
+                f'{result["p95_ms"]:>8.1f} {result["p99_ms"]:>8.1f} '
+                f'{result["rps"] or 0:>7.0f} {result["queries"]:>5.1f}'
+            )
+            if name in previous:
+                for key in ('p50_ms', 'p95_ms'):
+                    before = previous[name][key]
+                    change = (result[key] / before - 1) if before else 0
+                    line += f' {change:>+7.0%}'
+            self.stdout.write(line)
+
+    def report_concurrency(self, concurrency, baseline):
+        previous = (baseline or {}).get('concurrency') or {}
+        self.stdout.write(
+            f'\nОдновременно: читателей {concurrency["readers"]}, '
+            f'писателей {concurrency["writers"]}, '
+            f'{concurrency["duration"]:g} с'
+        )
+        for kind, title in (('reads', 'чтение'), ('writes', 'запись')):
+            result = concurrency[kind]
+            line = (
+                f'{title:<8} {result["per_second"]:>7.0f} в с, '
+                f'p95 {result["p95_ms"] or 0:>7.1f} мс, '
+                f'ошибок {result["errors"]}'
+            )
+            before = previous.get(kind, {}).get('per_second')
+            if before:
+                line += f' ({result["per_second"] / before - 1:+.0%})'
+            self.stdout.write(line)
+
+    @staticmethod
+    def use_profile(name, path):
+        """Переключает соединение на профиль базы и временный файл."""
+        connection.close()
+        if name is not None:
+            connection.settings_dict.update(
+                copy.deepcopy(settings.DATABASE_PROFILES[name])
+            )
+        connection.settings_dict['TEST'] = {
+            **connection.settings_dict.get('TEST', {}), 'NAME': path,
+        }
+
+    @staticmethod
+    def journal_mode():
+        if connection.vendor != 'sqlite':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0]
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создает недостающие версии картинок постов'
+
+    def handle(self, *args, **options):
+        count = thumbnails.generate_missing()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {count}'
+        ))
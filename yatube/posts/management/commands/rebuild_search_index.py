@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс постов с нуля'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в индексе: {search.size()}'
+        ))
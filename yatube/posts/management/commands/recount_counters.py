@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики постов и профилей'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            profiles = counters.recount_profiles()
+            posts = counters.recount_posts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано профилей: {profiles}, постов: {posts}'
+        ))
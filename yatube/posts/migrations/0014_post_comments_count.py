@@ -0,0 +1,49 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(model, field, outer):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    Profile = apps.get_model('users', 'Profile')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post.objects.update(comments_count=_count(Comment, 'post', 'pk'))
+    Profile.objects.bulk_create(
+        Profile(user_id=pk)
+        for pk in User.objects.values_list('pk', flat=True).iterator()
+    )
+    Profile.objects.update(
+        posts_count=_count(Post, 'author', 'user'),
+        followers_count=_count(Follow, 'author', 'user'),
+        following_count=_count(Follow, 'user', 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_timelineentry'),
+        ('users', '0001_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
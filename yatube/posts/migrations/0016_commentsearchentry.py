@@ -0,0 +1,163 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:28
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копия токенизатора posts.search на момент создания индекса: миграция
+# не должна зависеть от живого кода, который может измениться.
+VOWELS = 'аеиоуыэюя'
+
+
+def _endings(after_a=(), other=()):
+    """Окончания класса, самые длинные первыми.
+
+    Окончания after_a засчитываются, только если перед ними стоит «а»
+    или «я» (первая группа в описании Snowball).
+    """
+    endings = ([(ending, True) for ending in after_a]
+               + [(ending, False) for ending in other])
+    return sorted(endings, key=lambda item: len(item[0]), reverse=True)
+
+
+PERFECTIVE_GERUND = _endings(
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = _endings(other=(
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = _endings(('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = _endings(other=('ся', 'сь'))
+VERB = _endings(
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+     'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+     'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+     'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = _endings(other=(
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+))
+SUPERLATIVE = _endings(other=('ейш', 'ейше'))
+DERIVATIONAL = _endings(other=('ост', 'ость'))
+
+WORD_RE = re.compile(r'\w+')
+
+
+def _regions(word):
+    """Начала областей RV и R2 по правилам Snowball."""
+    rv = r1 = r2 = len(word)
+    for index, char in enumerate(word):
+        if char in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, endings):
+    """Отрезает самое длинное окончание, лежащее в области от start.
+
+    Возвращает None, если окончание не найдено.
+    """
+    for ending, after_a in endings:
+        if not word.endswith(ending):
+            continue
+        position = len(word) - len(ending)
+        if after_a:
+            if position - 1 >= start and word[position - 1] in 'ая':
+                return word[:position]
+        elif position >= start:
+            return word[:position]
+        return None
+    return None
+
+
+def stem(word):
+    """Основа русского слова (Snowball Russian stemmer)."""
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    stemmed = _strip(word, rv, PERFECTIVE_GERUND)
+    if stemmed is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        stemmed = _strip(word, rv, ADJECTIVE)
+        if stemmed is not None:
+            stemmed = _strip(stemmed, rv, PARTICIPLE) or stemmed
+        else:
+            stemmed = _strip(word, rv, VERB)
+            if stemmed is None:
+                stemmed = _strip(word, rv, NOUN)
+    if stemmed is not None:
+        word = stemmed
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    word = _strip(word, r2, DERIVATIONAL) or word
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    stemmed = _strip(word, rv, SUPERLATIVE)
+    if stemmed is not None:
+        word = stemmed
+        if word.endswith('нн') and len(word) - 2 >= rv:
+            word = word[:-1]
+    elif word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def terms(text):
+    """Основы слов текста в порядке появления."""
+    return [stem(word)[:64] for word in WORD_RE.findall(text)]
+
+
+def fill_search_entries(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    CommentSearchEntry = apps.get_model('posts', 'CommentSearchEntry')
+    CommentSearchEntry.objects.bulk_create(
+        (CommentSearchEntry(comment_id=comment.pk, term=term, weight=weight)
+         for comment in Comment.objects.only('pk', 'text').iterator()
+         for term, weight in Counter(terms(comment.text)).items()),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_searchentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommentSearchEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='основа')),
+                ('weight', models.PositiveIntegerField(default=1, verbose_name='частота')),
+                ('comment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_entries', to='posts.Comment', verbose_name='комментарий')),
+            ],
+            options={
+                'verbose_name': 'Запись поискового индекса комментариев',
+                'verbose_name_plural': 'Поисковый индекс комментариев',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='commentsearchentry',
+            index=models.Index(fields=['term', 'comment'], name='search_term_comment_idx'),
+        ),
+        migrations.RunPython(fill_search_entries, migrations.RunPython.noop),
+    ]
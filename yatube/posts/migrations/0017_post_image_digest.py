@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_commentsearchentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_digest',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
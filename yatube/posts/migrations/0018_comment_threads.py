@@ -0,0 +1,37 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:36
+
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, LPad
+import django.db.models.deletion
+
+
+def fill_paths(apps, schema_editor):
+    # Все существующие комментарии — ответы на сам пост.
+    Comment = apps.get_model('posts', 'Comment')
+    Comment.objects.update(path=Concat(
+        LPad(Cast('pk', CharField()), 10, Value('0')),
+        Value('/'),
+        output_field=CharField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_image_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='posts.Comment', verbose_name='ответ на'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255, verbose_name='путь'),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
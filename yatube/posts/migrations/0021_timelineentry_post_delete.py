@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_post_updated'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='timelineentry',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='timeline', to='posts.Post', verbose_name='пост'),
+        ),
+    ]
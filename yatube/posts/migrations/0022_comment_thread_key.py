@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-17 05:30
+
+from django.db import migrations, models
+from django.db.models import CharField, ExpressionWrapper, IntegerField, Value
+from django.db.models.functions import Cast, Concat, LPad, Substr
+
+
+def fill_thread_keys(apps, schema_editor):
+    # Первый сегмент пути — id корня, он заменяется на 9999999999 - id.
+    Comment = apps.get_model('posts', 'Comment')
+    root = ExpressionWrapper(
+        Value(9999999999) - Cast(Substr('path', 1, 10), IntegerField()),
+        output_field=IntegerField(),
+    )
+    Comment.objects.using(schema_editor.connection.alias).update(
+        thread_key=Concat(
+            LPad(Cast(root, CharField()), 10, Value('0')),
+            Value('/'),
+            Substr('path', 12),
+            output_field=CharField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_timelineentry_post_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='thread_key',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='ключ ветки'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'thread_key'], name='comment_post_thread_idx'),
+        ),
+        migrations.RunPython(fill_thread_keys, migrations.RunPython.noop,
+                             hints={'model_name': 'comment'}),
+    ]
@@ -1,6 +1,12 @@
 from core.models import CreatedModel
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import (CharField, ExpressionWrapper, IntegerField,
+                              OuterRef, Q, Subquery, Value)
+from django.db.models.functions import Cast, Coalesce, Concat, LPad, Substr
+from django.dispatch import Signal
+
+from . import shards
 
 User = get_user_model()
 
@@ -18,7 +24,32 @@ class Group(models.Model):
         verbose_name_plural = 'Группы'
 
 
-class Post(CreatedModel):
+# bulk_create не вызывает post_save: денормализованные данные (счетчики,
+# ленты подписок) обновляются по этому сигналу для затронутых авторов.
+posts_bulk_created = Signal(providing_args=['authors'])
+
+
+class PostQuerySet(shards.ShardedQuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        posts_bulk_created.send(
+            sender=self.model, authors={post.author_id for post in objs}
+        )
+        return objs
+
+    def for_feed(self):
+        """Посты для ленты: автор и группа загружаются тем же запросом,
+        без N+1 в шаблонах. Число комментариев хранится в самом посте."""
+        return shards.select_related(self, 'author', 'group')
+
+    def shard_of(self, post_id):
+        """Выборка из шарда поста post_id (без шардов — она же)."""
+        if not shards.enabled():
+            return self
+        return self.using(shards.for_pk(post_id))
+
+
+class Post(shards.ShardedModel, CreatedModel):
     text = models.TextField(verbose_name='текст')
     author = models.ForeignKey(User,
                                on_delete=models.CASCADE,
@@ -39,6 +70,14 @@ class Post(CreatedModel):
         blank=True,
         null=True,
     )
+    # SHA-256 картинки, когда ее версии готовы (posts.renditions).
+    image_digest = models.CharField(max_length=64, blank=True,
+                                    editable=False)
+    comments_count = models.PositiveIntegerField('комментариев', default=0)
+    # Версия кэшированной карточки поста (posts.templatetags.post_cards).
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:15]
@@ -47,9 +86,88 @@ class Post(CreatedModel):
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты автора и группы читаются диапазоном индекса уже в
+        # порядке (-pub_date, -id), без сортировки после фильтра.
+        indexes = [
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+        ]
+
 
+# Путь комментария — id всех его предков и его собственный, дополненные
+# нулями до PATH_SEGMENT цифр и разделенные «/». Сортировка по пути дает
+# обход дерева в глубину, а поддерево — диапазон [path, path + ':'),
+# который читается по индексу: ':' идет сразу после цифр.
+# Ключ ветки — тот же путь, в котором id корня заменен на
+# THREAD_KEY_BASE - id: сортировка по ключу дает порядок показа, новые
+# ветки первыми и ответы деревом под корнем, по индексу (post, thread_key).
+PATH_SEGMENT = 10
+THREAD_KEY_BASE = 10 ** PATH_SEGMENT - 1
+COMMENT_MAX_DEPTH = 20
 
-class Comment(CreatedModel):
+
+def path_segment(pk):
+    return f'{pk:0{PATH_SEGMENT}d}/'
+
+
+def subtree_q(path):
+    return Q(path__gte=path, path__lt=path + ':')
+
+
+def thread_key(path):
+    root = int(path[:PATH_SEGMENT])
+    return path_segment(THREAD_KEY_BASE - root) + path[PATH_SEGMENT + 1:]
+
+
+def thread_key_expression():
+    """thread_key(path) в SQL, для UPDATE без загрузки строк."""
+    root = ExpressionWrapper(
+        Value(THREAD_KEY_BASE) - Cast(Substr('path', 1, PATH_SEGMENT),
+                                      IntegerField()),
+        output_field=IntegerField(),
+    )
+    return Concat(
+        LPad(Cast(root, CharField()), PATH_SEGMENT, Value('0')),
+        Value('/'),
+        Substr('path', PATH_SEGMENT + 2),
+        output_field=CharField(),
+    )
+
+
+class CommentQuerySet(shards.ShardedQuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        # id новых строк известны не на всех СУБД: пути заполняются
+        # одним UPDATE в базе.
+        comments = self.model.objects.using(self.db)
+        comments.filter(path='').update(path=Concat(
+            Coalesce(Subquery(comments.filter(
+                pk=OuterRef('parent_id')
+            ).values('path')), Value('')),
+            LPad(Cast('pk', CharField()), PATH_SEGMENT, Value('0')),
+            Value('/'),
+            output_field=CharField(),
+        ))
+        comments.filter(thread_key='').update(
+            thread_key=thread_key_expression()
+        )
+        return objs
+
+    def roots(self):
+        return self.filter(parent=None)
+
+    def subtree(self, comment):
+        """Комментарий и все ответы на него в порядке показа."""
+        return self.filter(subtree_q(comment.path)).order_by('path')
+
+    def threads(self):
+        """Комментарии в порядке показа: ветки по ключу (см. thread_key)."""
+        return shards.select_related(self, 'author').order_by('thread_key')
+
+
+class Comment(shards.ShardedModel, CreatedModel):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -63,11 +181,51 @@ class Comment(CreatedModel):
         verbose_name='автор'
     )
     text = models.TextField(verbose_name='текст')
+    parent = models.ForeignKey(
+        'self',
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='replies',
+        verbose_name='ответ на'
+    )
+    path = models.CharField('путь', max_length=255, blank=True,
+                            editable=False, db_index=True)
+    thread_key = models.CharField('ключ ветки', max_length=255,
+                                  blank=True, editable=False)
+
+    objects = CommentQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', '-pub_date', '-id'],
+                         name='comment_post_date_idx'),
+            models.Index(fields=['post', 'thread_key'],
+                         name='comment_post_thread_idx'),
+        ]
+
+    @property
+    def depth(self):
+        """Уровень вложенности: 0 у комментария к самому посту."""
+        return max(len(self.path) // (PATH_SEGMENT + 1) - 1, 0)
+
+    def save(self, *args, **kwargs):
+        if self.parent is not None and (
+            self.parent.depth >= COMMENT_MAX_DEPTH
+        ):
+            # Слишком глубокие ответы становятся соседями родителя.
+            self.parent = self.parent.parent
+        super().save(*args, **kwargs)
+        if not self.path:
+            parent_path = self.parent.path if self.parent else ''
+            self.path = parent_path + path_segment(self.pk)
+            self.thread_key = thread_key(self.path)
+            Comment.objects.using(self._state.db).filter(
+                pk=self.pk
+            ).update(path=self.path, thread_key=self.thread_key)
 
 
 class Follow(models.Model):
@@ -87,7 +245,91 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        # Уникальное ограничение уже дает индекс (user, author) для
+        # подписок читателя; обратный нужен для подписчиков автора.
         constraints = [
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_following')
         ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follow_author_user_idx'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Запись в ленте подписок пользователя (fan-out on write)."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='читатель'
+    )
+    # Записи удаляет сигнал удаления поста: пост может лежать в шарде,
+    # а лента — в основной базе (см. posts.shards).
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.DO_NOTHING,
+        related_name='timeline',
+        verbose_name='пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx'),
+        ]
+
+
+class SearchEntry(models.Model):
+    """Строка инвертированного индекса: основа слова в тексте поста."""
+    term = models.CharField('основа', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_entries',
+        verbose_name='пост'
+    )
+    weight = models.PositiveIntegerField('частота', default=1)
+
+    class Meta:
+        verbose_name = 'Запись поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+        indexes = [
+            models.Index(fields=['term', 'post'],
+                         name='search_term_post_idx'),
+        ]
+
+
+class CommentSearchEntry(models.Model):
+    """Строка инвертированного индекса: основа слова в комментарии."""
+    term = models.CharField('основа', max_length=64)
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        related_name='search_entries',
+        verbose_name='комментарий'
+    )
+    weight = models.PositiveIntegerField('частота', default=1)
+
+    class Meta:
+        verbose_name = 'Запись поискового индекса комментариев'
+        verbose_name_plural = 'Поисковый индекс комментариев'
+        indexes = [
+            models.Index(fields=['term', 'comment'],
+                         name='search_term_comment_idx'),
+        ]
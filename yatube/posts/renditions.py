@@ -0,0 +1,165 @@
+"""Адаптивные версии картинок постов.
+
+Каждая картинка сохраняется в нескольких ширинах (POST_IMAGE_WIDTHS)
+и форматах: AVIF и WebP, если Pillow умеет их записывать, и JPEG для
+остальных браузеров. Шаблон перечисляет версии в srcset, и браузер
+скачивает самую легкую подходящую.
+
+Имена версий адресуются содержимым: в путь входят SHA-256 исходника
+и параметры версии. Уже созданная версия не пересоздается, а новая
+картинка или новые параметры получают новые имена, поэтому файлы
+можно отдавать с бессрочным кэшированием.
+"""
+import hashlib
+import tempfile
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
+
+ASPECT_RATIO = (960, 339)
+# Современные форматы в порядке предпочтения; JPEG понимают все.
+MODERN_FORMATS = ('AVIF', 'WEBP')
+FALLBACK_FORMAT = 'JPEG'
+EXTENSIONS = {'AVIF': 'avif', 'WEBP': 'webp', 'JPEG': 'jpg'}
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp',
+              'JPEG': 'image/jpeg'}
+UPLOAD_TO = 'renditions'
+# Форматы, в которых загруженная картинка пересохраняется как есть.
+UPLOAD_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+# Тег EXIF Orientation: 1 — картинку поворачивать не нужно.
+ORIENTATION = 0x0112
+CHUNK_SIZE = 64 * 1024
+
+
+@lru_cache(maxsize=None)
+def formats():
+    """Форматы версий, которые может записать Pillow; JPEG последний."""
+    Image.init()
+    return tuple(
+        [name for name in MODERN_FORMATS if name in Image.SAVE]
+        + [FALLBACK_FORMAT]
+    )
+
+
+def size(width):
+    return width, round(width * ASPECT_RATIO[1] / ASPECT_RATIO[0])
+
+
+def name(digest, width, image_format):
+    """Путь версии в хранилище."""
+    width, height = size(width)
+    return (f'{UPLOAD_TO}/{digest[:2]}/{digest[2:]}/'
+            f'{width}x{height}q{settings.POST_IMAGE_QUALITY}.'
+            f'{EXTENSIONS[image_format]}')
+
+
+def file_digest(source):
+    hasher = hashlib.sha256()
+    for chunk in source.chunks(CHUNK_SIZE):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _render(image, width, image_format):
+    rendition = ImageOps.fit(image, size(width), Image.LANCZOS)
+    if image_format == FALLBACK_FORMAT and rendition.mode == 'RGBA':
+        # В JPEG нет прозрачности: подкладываем белый фон.
+        background = Image.new('RGB', rendition.size, 'white')
+        background.paste(rendition, mask=rendition.getchannel('A'))
+        rendition = background
+    buffer = BytesIO()
+    rendition.save(buffer, image_format,
+                   quality=settings.POST_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def generate(source_name):
+    """Создает недостающие версии картинки и возвращает ее digest."""
+    with default_storage.open(source_name) as source:
+        digest = file_digest(source)
+        missing = [
+            (width, image_format)
+            for width in settings.POST_IMAGE_WIDTHS
+            for image_format in formats()
+            if not default_storage.exists(name(digest, width, image_format))
+        ]
+        if not missing:
+            return digest
+        source.seek(0)
+        with Image.open(source) as image:
+            image = ImageOps.exif_transpose(image)
+            has_alpha = (image.mode in ('RGBA', 'LA', 'PA')
+                         or 'transparency' in image.info)
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+            for width, image_format in missing:
+                default_storage.save(
+                    name(digest, width, image_format),
+                    ContentFile(_render(image, width, image_format)),
+                )
+    return digest
+
+
+def sources(digest):
+    """srcset для каждого формата: [(формат, MIME-тип, srcset), ...]."""
+    result = []
+    for image_format in formats():
+        srcset = ', '.join(
+            f'{default_storage.url(name(digest, width, image_format))} '
+            f'{width}w'
+            for width in settings.POST_IMAGE_WIDTHS
+        )
+        result.append((image_format, MIME_TYPES[image_format], srcset))
+    return result
+
+
+def fallback_url(digest):
+    """Самая широкая JPEG-версия для браузеров без srcset."""
+    return default_storage.url(
+        name(digest, max(settings.POST_IMAGE_WIDTHS), FALLBACK_FORMAT)
+    )
+
+
+def normalize(upload):
+    """Загруженная картинка, уменьшенная до POST_IMAGE_MAX_SIDE.
+
+    Картинка в допустимом формате, которую не нужно ни уменьшать, ни
+    поворачивать, а также анимация сохраняются как есть, без повторного
+    сжатия. Число пикселей проверяется заранее (POST_IMAGE_MAX_PIXELS),
+    JPEG декодируется сразу в уменьшенном масштабе (draft), а результат
+    пишется во временный файл на диске.
+    """
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    file_name = upload.name
+    upload.seek(0)
+    with Image.open(upload) as image:
+        image_format = image.format
+        convert = image_format not in UPLOAD_FORMATS or (
+            image_format not in Image.SAVE
+        )
+        if not convert and (
+            getattr(image, 'is_animated', False)
+            or max(image.size) <= max_side
+            and image.getexif().get(ORIENTATION, 1) == 1
+        ):
+            upload.seek(0)
+            return upload
+        if convert:
+            image_format = 'PNG'
+            file_name = f'{file_name.rsplit(".", 1)[0]}.png'
+        if image_format == 'JPEG':
+            image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    result = UploadedFile(tempfile.TemporaryFile(), file_name,
+                          Image.MIME[image_format])
+    image.save(result, image_format, quality=settings.POST_IMAGE_QUALITY)
+    result.size = result.tell()
+    result.seek(0)
+    return result
@@ -0,0 +1,247 @@
+"""Полнотекстовый поиск по постам на инвертированном индексе.
+
+Индекс — таблица SearchEntry (основа слова, пост, частота) и такая же
+CommentSearchEntry для комментариев. Он обновляется при сохранении,
+а поиск читает только строки с основами из запроса, поэтому не
+сканирует всю таблицу. Основы получаются стеммером Snowball для
+русского языка.
+
+При шардировании (posts.shards) строки индекса лежат в шарде своего
+поста, а поиск сливает ранжированные результаты шардов.
+"""
+import math
+import re
+from collections import Counter
+
+from django.core.paginator import Paginator
+from django.db.models import Case, Count, F, FloatField, Max, Sum, When
+
+from . import shards
+from .models import Comment, CommentSearchEntry, Post, SearchEntry
+
+VOWELS = 'аеиоуыэюя'
+
+
+def _endings(after_a=(), other=()):
+    """Окончания класса, самые длинные первыми.
+
+    Окончания after_a засчитываются, только если перед ними стоит «а»
+    или «я» (первая группа в описании Snowball).
+    """
+    endings = ([(ending, True) for ending in after_a]
+               + [(ending, False) for ending in other])
+    return sorted(endings, key=lambda item: len(item[0]), reverse=True)
+
+
+PERFECTIVE_GERUND = _endings(
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = _endings(other=(
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = _endings(('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = _endings(other=('ся', 'сь'))
+VERB = _endings(
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+     'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+     'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+     'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = _endings(other=(
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+))
+SUPERLATIVE = _endings(other=('ейш', 'ейше'))
+DERIVATIONAL = _endings(other=('ост', 'ость'))
+
+WORD_RE = re.compile(r'\w+')
+
+
+def _regions(word):
+    """Начала областей RV и R2 по правилам Snowball."""
+    rv = r1 = r2 = len(word)
+    for index, char in enumerate(word):
+        if char in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+def _strip(word, start, endings):
+    """Отрезает самое длинное окончание, лежащее в области от start.
+
+    Возвращает None, если окончание не найдено.
+    """
+    for ending, after_a in endings:
+        if not word.endswith(ending):
+            continue
+        position = len(word) - len(ending)
+        if after_a:
+            if position - 1 >= start and word[position - 1] in 'ая':
+                return word[:position]
+        elif position >= start:
+            return word[:position]
+        return None
+    return None
+
+
+def stem(word):
+    """Основа русского слова (Snowball Russian stemmer)."""
+    word = word.lower().replace('ё', 'е')
+    rv, r2 = _regions(word)
+    stemmed = _strip(word, rv, PERFECTIVE_GERUND)
+    if stemmed is None:
+        word = _strip(word, rv, REFLEXIVE) or word
+        stemmed = _strip(word, rv, ADJECTIVE)
+        if stemmed is not None:
+            stemmed = _strip(stemmed, rv, PARTICIPLE) or stemmed
+        else:
+            stemmed = _strip(word, rv, VERB)
+            if stemmed is None:
+                stemmed = _strip(word, rv, NOUN)
+    if stemmed is not None:
+        word = stemmed
+    if word.endswith('и') and len(word) - 1 >= rv:
+        word = word[:-1]
+    word = _strip(word, r2, DERIVATIONAL) or word
+    if word.endswith('нн') and len(word) - 2 >= rv:
+        return word[:-1]
+    stemmed = _strip(word, rv, SUPERLATIVE)
+    if stemmed is not None:
+        word = stemmed
+        if word.endswith('нн') and len(word) - 2 >= rv:
+            word = word[:-1]
+    elif word.endswith('ь') and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def terms(text):
+    """Основы слов текста в порядке появления."""
+    max_length = SearchEntry._meta.get_field('term').max_length
+    return [stem(word)[:max_length] for word in WORD_RE.findall(text)]
+
+
+def _index(entry_model, field, obj):
+    entries = entry_model.objects.using(obj._state.db)
+    entries.filter(**{field: obj}).delete()
+    entries.bulk_create(
+        entry_model(term=term, weight=weight, **{field: obj})
+        for term, weight in Counter(terms(obj.text)).items()
+    )
+
+
+def index_post(post):
+    """Перестраивает строки индекса одного поста."""
+    _index(SearchEntry, 'post', post)
+
+
+def index_comment(comment):
+    """Перестраивает строки индекса одного комментария."""
+    _index(CommentSearchEntry, 'comment', comment)
+
+
+def index_missing(posts):
+    """Индексирует посты, у которых еще нет строк индекса, во всех шардах."""
+    posts = posts.filter(search_entries__isnull=True).only('pk', 'text')
+    for queryset in shards.each(posts):
+        for post in queryset.iterator():
+            index_post(post)
+
+
+def rebuild():
+    """Перестраивает индекс постов и комментариев в каждом шарде."""
+    for model in (SearchEntry, CommentSearchEntry):
+        for entries in shards.each(model.objects.all()):
+            entries.delete()
+    index_missing(Post.objects.all())
+    for comments in shards.each(Comment.objects.only('pk', 'text')):
+        for comment in comments.iterator():
+            index_comment(comment)
+
+
+def size():
+    """Число строк индекса постов во всех шардах."""
+    return shards.across(SearchEntry.objects.all()).count()
+
+
+def matching(entry_model, field, query):
+    """Подзапрос id объектов, содержащих все основы из запроса.
+
+    Как и обычный поиск админки Django, находит только объекты, где
+    встречается каждое слово запроса.
+    """
+    query_terms = set(terms(query))
+    return entry_model.objects.filter(
+        term__in=query_terms
+    ).values(field).annotate(
+        matched=Count('term', distinct=True)
+    ).filter(matched=len(query_terms)).values(field)
+
+
+def _statistics(query_terms):
+    """Число постов с каждой основой и оценка числа всех постов.
+
+    Считаются по всем шардам (posts.shards): оценки постов из разных
+    шардов тогда сравнимы.
+    """
+    frequencies = Counter()
+    total = 0
+    for using in shards.aliases() or (None,):
+        frequencies.update(dict(SearchEntry.objects.using(using).filter(
+            term__in=query_terms
+        ).order_by().values_list('term').annotate(posts=Count('pk'))))
+        # Максимальный id — дешевая оценка числа постов вместо COUNT(*).
+        total = max(total, Post.objects.using(using).aggregate(
+            total=Max('pk')
+        )['total'] or 0)
+    return frequencies, total or 1
+
+
+def search(query):
+    """Ранжированные id постов: сумма tf * idf по основам запроса."""
+    query_terms = set(terms(query))
+    frequencies, total = _statistics(query_terms)
+    idf = [When(term=term, then=math.log(1 + total / posts))
+           for term, posts in frequencies.items()]
+
+    def ranked(using):
+        entries = SearchEntry.objects.using(using).filter(
+            term__in=query_terms
+        )
+        if not idf:
+            return entries.none().values('post_id')
+        # По столбцу post_id, а не по post: для внешнего ключа Django
+        # сортирует по порядку модели Post через JOIN.
+        return entries.values('post_id').annotate(
+            score=Sum(F('weight') * Case(*idf, output_field=FloatField()),
+                      output_field=FloatField())
+        ).order_by('-score', '-post_id')
+
+    if shards.enabled():
+        return shards.merge(ranked(alias) for alias in shards.aliases())
+    return ranked(None)
+
+
+def get_page(query, page_number, per_page=10):
+    """Страница результатов поиска с загруженными постами."""
+    page = Paginator(search(query), per_page).get_page(page_number)
+    posts = shards.across(Post.objects.for_feed()).in_bulk(
+        [row['post_id'] for row in page.object_list]
+    )
+    page.object_list = [posts[row['post_id']] for row in page.object_list]
+    return page
@@ -1,8 +1,27 @@
 from rest_framework import serializers
+
 from .models import Post
 
 
-class PostSerializer(serializers.ModelSerializer):
+class FieldsMixin:
+    """Оставляет в ответе только поля из параметра ?fields=a,b."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = request.query_params.get('fields') if request else None
+        if fields:
+            for name in set(self.fields) - set(fields.split(',')):
+                self.fields.pop(name)
+
+
+class PostSerializer(FieldsMixin, serializers.ModelSerializer):
+    author = serializers.SlugRelatedField(slug_field='username',
+                                          read_only=True)
+    group = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+    image = serializers.ImageField(use_url=True, read_only=True)
+
     class Meta:
         model = Post
-        fields = ('text', 'pub_date', 'author')
+        fields = ('id', 'text', 'pub_date', 'author', 'group', 'image',
+                  'comments_count')
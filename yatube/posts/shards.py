@@ -0,0 +1,278 @@
+"""Горизонтальное шардирование постов и комментариев по автору.
+
+settings.POST_SHARDS — alias баз-шардов. Пока список пуст, шардирования
+нет и все живет в основной базе.
+
+Пост хранится в шарде POST_SHARDS[author_id % N], комментарии и строки
+поискового индекса — в шарде своего поста, поэтому профиль и страница
+поста читаются из одной базы. id поста и комментария сравнимы с
+номером шарда по модулю N (next_pk): шард находится по id без запроса.
+
+Пользователи, группы и подписки остаются в основной базе. Внешние
+ключи на них в шардах не проверяются (PRAGMA foreign_keys = OFF), а
+автор и группа постов загружаются отдельным запросом (select_related).
+Каскад удаления тоже не выходит за пределы одной базы: записи лент при
+удалении поста и посты с комментариями при удалении пользователя
+удаляют сигналы pre_delete (posts.signals).
+Ленты главной, групп и подписок собираются из всех шардов слиянием по
+дате (across): каждый шард отдает только начало своей ленты.
+
+Бюджеты запросов (core.query_budget) рассчитаны на одну базу: ленты
+из шардов делают запросы в каждый шард.
+"""
+import heapq
+from functools import cmp_to_key
+from itertools import islice
+
+from django.conf import settings
+from django.db import models, router, transaction
+from django.db.models import Max, QuerySet, prefetch_related_objects
+
+SHARDED_MODELS = {'posts.post', 'posts.comment', 'posts.searchentry',
+                  'posts.commentsearchentry'}
+
+
+def aliases():
+    return tuple(getattr(settings, 'POST_SHARDS', ()))
+
+
+def enabled():
+    return bool(aliases())
+
+
+def for_author(author_id):
+    """Шард постов автора."""
+    shards = aliases()
+    return shards[author_id % len(shards)]
+
+
+def for_pk(pk):
+    """Шард поста или комментария по его id."""
+    shards = aliases()
+    return shards[int(pk) % len(shards)]
+
+
+def next_pk(model, alias):
+    """Следующий id строки в шарде: сравним с номером шарда по модулю N.
+
+    Вызывается только внутри транзакции шарда вместе с INSERT
+    (ShardedModel.save): иначе два писателя прочитают один MAX(pk).
+    Транзакции шардов наследуют TRANSACTION_MODE основной базы; в
+    профиле production это BEGIN IMMEDIATE, и второй писатель ждет
+    фиксации первого еще до чтения MAX(pk).
+    """
+    shards = aliases()
+    last = model._base_manager.using(alias).aggregate(
+        last=Max('pk')
+    )['last'] or 0
+    return (last // len(shards) + 1) * len(shards) + shards.index(alias)
+
+
+def select_related(queryset, *fields):
+    """select_related, а при шардах — prefetch_related: JOIN к таблицам
+    основной базы в шарде ничего не найдет."""
+    if enabled():
+        return queryset.prefetch_related(*fields)
+    return queryset.select_related(*fields)
+
+
+class ShardedQuerySet(QuerySet):
+    def create(self, **kwargs):
+        """Без явной базы объект сохраняется в шард по своим полям:
+        QuerySet.create выбрал бы базу без объекта-подсказки."""
+        if not enabled() or self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True)
+        return obj
+
+
+class ShardedModel(models.Model):
+    """Модель, строки которой при шардировании получают id от next_pk."""
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.pop('using', None) or router.db_for_write(
+            type(self), instance=self
+        )
+        if self.pk is not None or using not in aliases():
+            return super().save(*args, using=using, **kwargs)
+        with transaction.atomic(using=using):
+            self.pk = next_pk(type(self), using)
+            kwargs['force_insert'] = True
+            return super().save(*args, using=using, **kwargs)
+
+
+def _shard(model, hints):
+    if not enabled() or model._meta.label_lower not in SHARDED_MODELS:
+        return None
+    instance = hints.get('instance')
+    if instance is None:
+        return None
+    label = instance._meta.label_lower
+    if label == 'posts.post':
+        if instance.pk is not None:
+            return for_pk(instance.pk)
+        return for_author(instance.author_id)
+    if label in ('posts.comment', 'posts.searchentry'):
+        return for_pk(instance.post_id)
+    if label == 'posts.commentsearchentry':
+        return for_pk(instance.comment_id)
+    if (label == settings.AUTH_USER_MODEL.lower()
+            and model._meta.label_lower == 'posts.post'):
+        return for_author(instance.pk)
+    return None
+
+
+class ShardRouter:
+    """Направляет посты и комментарии в шард по объекту-подсказке.
+
+    Запросы без подсказки решает следующий роутер; выборки из всех
+    шардов собирает across, из шарда одного поста —
+    Post.objects.shard_of.
+    """
+    def db_for_read(self, model, **hints):
+        return _shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return _shard(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} & set(aliases()):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db not in aliases():
+            return None
+        return f'{app_label}.{model_name}' in SHARDED_MODELS
+
+
+def _value(obj, field):
+    if isinstance(obj, dict):
+        return obj[field]
+    for name in field.split('__'):
+        obj = getattr(obj, name)
+    return obj
+
+
+def _sort_key(ordering):
+    fields = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+    def compare(first, second):
+        for field, descending in fields:
+            a, b = _value(first, field), _value(second, field)
+            if a != b:
+                return ((a < b) - (a > b)) if descending else (
+                    (a > b) - (a < b)
+                )
+        return 0
+    return cmp_to_key(compare)
+
+
+class MergedQuerySet:
+    """Одна выборка из нескольких шардов.
+
+    Методы QuerySet, возвращающие выборку (filter, order_by, reverse,
+    for_feed...), применяются к выборке каждого шарда. Срез сливает уже
+    отсортированные ответы шардов (k-way merge), поэтому для [a:b]
+    каждый шард отдает не больше b строк. prefetch_related выполняется
+    один раз для слитого среза, а не в каждом шарде.
+    """
+    def __init__(self, querysets, prefetch=()):
+        self.querysets = [queryset.prefetch_related(None)
+                          for queryset in querysets]
+        self.prefetch = tuple(dict.fromkeys(
+            (*prefetch, *querysets[0]._prefetch_related_lookups)
+        ))
+        self.model = querysets[0].model
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        getattr(self.querysets[0], name)
+
+        def method(*args, **kwargs):
+            querysets = [getattr(queryset, name)(*args, **kwargs)
+                         for queryset in self.querysets]
+            if not isinstance(querysets[0], QuerySet):
+                raise TypeError(f'{name}() не поддерживается для шардов')
+            return MergedQuerySet(querysets, self.prefetch)
+        return method
+
+    @property
+    def ordered(self):
+        return self.querysets[0].ordered
+
+    @property
+    def ordering(self):
+        query = self.querysets[0].query
+        ordering = query.order_by or (
+            query.default_ordering and self.model._meta.ordering
+        ) or ()
+        if not query.standard_ordering:
+            ordering = [name[1:] if name.startswith('-') else f'-{name}'
+                        for name in ordering]
+        return ordering
+
+    def _fetch(self, start, stop):
+        merged = heapq.merge(
+            *(queryset if stop is None else queryset[:stop]
+              for queryset in self.querysets),
+            key=_sort_key(self.ordering),
+        )
+        items = list(islice(merged, start, stop))
+        if self.prefetch and items and not isinstance(items[0], dict):
+            prefetch_related_objects(items, *self.prefetch)
+        return items
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            items = self._fetch(key, key + 1)
+            if not items:
+                raise IndexError(key)
+            return items[0]
+        if key.step is not None:
+            raise TypeError('Шаг среза не поддерживается')
+        return self._fetch(key.start or 0, key.stop)
+
+    def __iter__(self):
+        return iter(self._fetch(0, None))
+
+    def count(self):
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def exists(self):
+        return any(queryset.exists() for queryset in self.querysets)
+
+    def update(self, **kwargs):
+        return sum(queryset.update(**kwargs) for queryset in self.querysets)
+
+    def in_bulk(self, id_list=None):
+        objects = {}
+        for queryset in self.querysets:
+            objects.update(queryset.in_bulk(id_list))
+        if self.prefetch and objects:
+            prefetch_related_objects(list(objects.values()), *self.prefetch)
+        return objects
+
+
+def merge(querysets):
+    """Выборки шардов как одна (см. MergedQuerySet)."""
+    return MergedQuerySet(list(querysets))
+
+
+def each(queryset):
+    """Выборки каждого шарда по отдельности; без шардирования — она же."""
+    if not enabled():
+        return [queryset]
+    return [queryset.using(alias) for alias in aliases()]
+
+
+def across(queryset):
+    """Выборка из всех шардов; без шардирования — она же."""
+    if not enabled():
+        return queryset
+    return merge(each(queryset))
@@ -0,0 +1,179 @@
+from core import purge
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import counters, feed_cache, search, shards, timeline
+from .models import (Comment, Follow, Group, Post, TimelineEntry, User,
+                     posts_bulk_created)
+
+AUTHOR_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Post)
+def push_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        timeline.push_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_profile(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_save, sender=Post)
+def index_for_search(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.bump_profile(instance.author_id, 'posts_count', -1)
+
+
+@receiver(posts_bulk_created, sender=Post)
+def refresh_after_bulk_create(sender, authors, **kwargs):
+    counters.recount_profiles(User.objects.filter(pk__in=authors))
+    timeline.backfill_followers(authors)
+    feed_cache.bump(feed_cache.GLOBAL)
+    search.index_missing(Post.objects.filter(author_id__in=authors))
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post(instance.post_id, 1)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment_for_search(sender, instance, **kwargs):
+    search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_profile(instance.author_id, 'followers_count', 1)
+        counters.bump_profile(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.bump_profile(instance.author_id, 'followers_count', -1)
+    counters.bump_profile(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline(sender, instance, **kwargs):
+    timeline.trim(instance.user_id, instance.author_id)
+
+
+@receiver(pre_delete, sender=Post)
+def delete_timeline_entries(sender, instance, **kwargs):
+    # Каскад удаления идет в базе поста, а лента живет в основной.
+    TimelineEntry.objects.filter(post_id=instance.pk).delete()
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_content(sender, instance, **kwargs):
+    # Каскад от пользователя видит только основную базу: посты автора и
+    # его комментарии к чужим постам лежат в шардах.
+    if not shards.enabled():
+        return
+    Post.objects.using(shards.for_author(instance.pk)).filter(
+        author_id=instance.pk
+    ).delete()
+    for alias in shards.aliases():
+        Comment.objects.using(alias).filter(author_id=instance.pk).delete()
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, using, **kwargs):
+    instance._previous_group_ids = set(Post.objects.using(using).filter(
+        pk=instance.pk
+    ).values_list('group_id', flat=True)) if instance.pk else set()
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    feed_cache.bump_post(instance,
+                         getattr(instance, '_previous_group_ids', ()))
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_feeds(sender, instance, **kwargs):
+    feed_cache.bump_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    feed_cache.bump_post(instance.post)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_feed(sender, instance, **kwargs):
+    feed_cache.bump(feed_cache.follow_scope(instance.user_id),
+                    feed_cache.follow_scope(instance.author_id))
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, using, **kwargs):
+    instance._previous_slug = Group.objects.using(using).filter(
+        pk=instance.pk
+    ).values_list('slug', flat=True).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_feed(sender, instance, created, **kwargs):
+    if created:
+        feed_cache.bump(feed_cache.group_scope(instance.pk))
+    else:
+        # Название и адрес группы показаны в постах всех лент.
+        feed_cache.bump(feed_cache.GLOBAL)
+    # Страницы группы по прежнему и новому адресу.
+    slugs = {instance.slug, getattr(instance, '_previous_slug', None)}
+    purge.purge(*(feed_cache.group_key(slug) for slug in slugs if slug))
+
+
+@receiver(post_delete, sender=Group)
+def invalidate_all_feeds(sender, instance, **kwargs):
+    # Посты группы теряют ссылку на нее без сигналов сохранения.
+    feed_cache.bump(feed_cache.GLOBAL)
+    purge.purge(feed_cache.group_key(instance.slug))
+
+
+@receiver(pre_save, sender=User)
+def remember_author_name(sender, instance, using, update_fields=None,
+                         **kwargs):
+    instance._previous_name = None
+    if instance.pk is None or (
+        update_fields is not None
+        and not set(AUTHOR_NAME_FIELDS) & set(update_fields)
+    ):
+        return
+    instance._previous_name = User.objects.using(using).filter(
+        pk=instance.pk
+    ).values_list(*AUTHOR_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_feeds(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_name', None)
+    name = tuple(getattr(instance, field) for field in AUTHOR_NAME_FIELDS)
+    if previous is not None and previous != name:
+        # Имя автора показано в его постах и комментариях во всех лентах.
+        feed_cache.bump(feed_cache.GLOBAL)
@@ -0,0 +1,62 @@
+"""Карточки постов для лент.
+
+Карточка (includes/post_card.html) одинакова во всех лентах и хранится
+во фрагментном кэше под ключом из id поста и его версии. Страница
+любой ленты собирается из готовых карточек одним get_many; отрисовать
+остается только недостающие.
+"""
+from core import metrics
+from core.cache import fragment_cache
+from django import template
+from django.conf import settings
+from django.core.cache.utils import make_template_fragment_key
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/post_card.html'
+
+
+def card_key(post):
+    """Ключ карточки: меняется вместе с любым показанным в ней полем.
+
+    Текст и группа меняются только через save(), который сдвигает
+    updated; счетчик комментариев и версии картинки обновляются
+    UPDATE без save() и входят в ключ сами.
+    """
+    return make_template_fragment_key('post_card', [
+        post.pk,
+        post.updated.timestamp(),
+        post.comments_count,
+        post.image_digest,
+        post.author.get_full_name(),
+        post.group.slug if post.group else '',
+    ])
+
+
+@register.simple_tag
+def post_cards(posts):
+    """HTML карточек постов в их порядке.
+
+    {% post_cards page_obj as cards %}
+    """
+    posts = list(posts)
+    if not posts:
+        return []
+    cache = fragment_cache()
+    keys = [card_key(post) for post in posts]
+    cached = cache.get_many(keys)
+    rendered = {}
+    cards = []
+    for post, key in zip(posts, keys):
+        card = cached.get(key)
+        metrics.record_cache(hit=card is not None)
+        if card is None:
+            card = rendered[key] = get_template(CARD_TEMPLATE).render(
+                {'post': post}
+            )
+        cards.append(mark_safe(card))
+    if rendered:
+        cache.set_many(rendered, settings.FEED_CACHE_TIMEOUT)
+    return cards
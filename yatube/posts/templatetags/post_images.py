@@ -0,0 +1,28 @@
+from django import template
+from django.conf import settings
+
+from .. import renditions, thumbnails
+
+register = template.Library()
+
+SIZES = '(max-width: 960px) 100vw, 960px'
+
+
+@register.inclusion_tag('includes/post_picture.html')
+def post_picture(post):
+    """<picture> с версиями картинки поста или заглушка, пока их нет."""
+    if not post.image:
+        return {}
+    digest = post.image_digest
+    if not digest:
+        # Версии еще создаются или пост загружен до их появления.
+        thumbnails.enqueue(post.image.name)
+        return {'placeholder': True}
+    *modern, fallback = renditions.sources(digest)
+    return {
+        'sources': modern,
+        'fallback': fallback,
+        'src': renditions.fallback_url(digest),
+        'size': renditions.size(max(settings.POST_IMAGE_WIDTHS)),
+        'sizes': SIZES,
+    }
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.test_runner import on_commit_callbacks
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, group=cls.group, text=f'Пост {number}')
+            for number in range(13)
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(ApiTests.reader)
+
+    def test_feeds(self):
+        """Все ленты отдают страницу постов и ссылку на следующую."""
+        urls = (
+            reverse('api:index'),
+            reverse('api:group', kwargs={'slug': ApiTests.group.slug}),
+            reverse('api:profile',
+                    kwargs={'username': ApiTests.user.username}),
+            reverse('api:follow'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.reader_client.get(url).json()
+                self.assertEqual(len(data['results']), 10)
+                self.assertIsNone(data['previous'])
+                data = self.reader_client.get(data['next']).json()
+                self.assertEqual(len(data['results']), 3)
+                self.assertIsNone(data['next'])
+
+    def test_post_detail(self):
+        post = Post.objects.first()
+        data = self.client.get(
+            reverse('api:post_detail', kwargs={'post_id': post.pk})
+        ).json()
+        self.assertEqual(data['text'], post.text)
+        self.assertEqual(data['author'], ApiTests.user.username)
+        self.assertEqual(data['group'], ApiTests.group.slug)
+
+    def test_follow_feed_requires_login(self):
+        response = self.client.get(reverse('api:follow'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_field_selection(self):
+        data = self.client.get(reverse('api:index'),
+                               {'fields': 'id,text'}).json()
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+
+    def test_not_modified(self):
+        """Неизменившаяся лента отдает 304 без запросов к постам."""
+        url = reverse('api:index')
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(context.captured_queries), 0)
+
+    def test_etag_changes_with_feed(self):
+        url = reverse('api:post_detail',
+                      kwargs={'post_id': Post.objects.first().pk})
+        etag = self.client.get(url)['ETag']
+        with on_commit_callbacks():
+            Comment.objects.create(post=Post.objects.first(),
+                                   author=ApiTests.reader,
+                                   text='Комментарий')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
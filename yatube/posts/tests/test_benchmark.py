@@ -0,0 +1,49 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from .. import benchmark
+from ..models import Comment, Post, TimelineEntry
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.dataset = benchmark.seed(users=8, groups=3, posts=40,
+                                     comments=30, follows_per_user=3)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_seed(self):
+        """Синтетические данные создаются с ответами и лентами подписок."""
+        self.assertEqual(self.dataset['users'], 8)
+        self.assertEqual(self.dataset['posts'], 40)
+        self.assertEqual(self.dataset['comments'], 30)
+        self.assertTrue(Comment.objects.exclude(parent=None).exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertFalse(Comment.objects.filter(path='').exists())
+
+    def test_popularity_skewed(self):
+        """Первые авторы пишут заметно больше постов, чем последние."""
+        first = Post.objects.filter(author__username='user0').count()
+        last = Post.objects.filter(author__username='user7').count()
+        self.assertGreater(first, last)
+
+    def test_every_view_measured(self):
+        """Сценарии покрывают все адреса posts.urls и не падают."""
+        self.assertEqual(benchmark.uncovered_views(), [])
+        results = benchmark.run(requests=2, warmup=1)
+        self.assertEqual(set(results), set(benchmark.SCENARIOS))
+        for name, result in results.items():
+            with self.subTest(view=name):
+                self.assertTrue(all(status < 400
+                                    for status in result['statuses']))
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+                self.assertGreater(result['rps'], 0)
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(samples, 50), 50)
+        self.assertEqual(benchmark.percentile(samples, 99), 99)
+        self.assertEqual(benchmark.percentile([7], 95), 7)
@@ -0,0 +1,77 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from users.models import Profile
+
+from ..models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def profile(self, user):
+        return Profile.objects.get(user=user)
+
+    def test_posts_count(self):
+        """Счетчик постов автора растет и уменьшается."""
+        post = Post.objects.create(author=CountersTests.author, text='Пост')
+        self.assertEqual(self.profile(CountersTests.author).posts_count, 1)
+        post.delete()
+        self.assertEqual(self.profile(CountersTests.author).posts_count, 0)
+
+    def test_comments_count(self):
+        """Счетчик комментариев поста."""
+        post = Post.objects.create(author=CountersTests.author, text='Пост')
+        comment = Comment.objects.create(post=post,
+                                         author=CountersTests.reader,
+                                         text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counts(self):
+        """Счетчики подписчиков и подписок."""
+        Follow.objects.create(user=CountersTests.reader,
+                              author=CountersTests.author)
+        self.assertEqual(
+            self.profile(CountersTests.author).followers_count, 1
+        )
+        self.assertEqual(
+            self.profile(CountersTests.reader).following_count, 1
+        )
+        Follow.objects.all().delete()
+        self.assertEqual(
+            self.profile(CountersTests.author).followers_count, 0
+        )
+
+    def test_recount_command_fixes_drift(self):
+        """Команда recount_counters исправляет расхождения."""
+        Post.objects.create(author=CountersTests.author, text='Пост')
+        Profile.objects.update(posts_count=42)
+        call_command('recount_counters', stdout=StringIO())
+        self.assertEqual(self.profile(CountersTests.author).posts_count, 1)
+
+    def test_profile_reads_counter(self):
+        """Страница профиля не считает посты через COUNT(*)."""
+        Post.objects.create(author=CountersTests.author, text='Пост')
+        with CaptureQueriesContext(connection) as context:
+            response = Client().get(
+                reverse('posts:profile',
+                        kwargs={'username': CountersTests.author.username})
+            )
+        self.assertEqual(response.context['post_count'], 1)
+        queries = ' '.join(query['sql'] for query in context.captured_queries)
+        self.assertNotIn('COUNT(', queries)
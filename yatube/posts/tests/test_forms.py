@@ -1,11 +1,13 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..models import Comment, Group, Post
 
@@ -143,3 +145,84 @@ class PostsFormsTests(TestCase):
         )
         # Убеждаемся, что комментарий не был создан
         self.assertEqual(Comment.objects.count(), comments_count)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='Boris')
+        self.client.force_login(self.user)
+
+    @staticmethod
+    def get_image(size, image_format='JPEG', name='photo.jpg'):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, image_format)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def post_image(self, image):
+        return self.client.post(reverse('posts:post_create'),
+                                {'text': 'test', 'image': image})
+
+    @override_settings(UPLOAD_MAX_FILE_SIZE=100)
+    def test_large_file_rejected(self):
+        """Файл больше лимита отклоняется, пост не создается."""
+        response = self.post_image(
+            self.get_image((200, 200), 'PNG', 'photo.png')
+        )
+        self.assertFormError(response, 'form', 'image',
+                             'Файл больше 100\xa0байт.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected(self):
+        """Картинка с большим числом пикселей отклоняется."""
+        response = self.post_image(self.get_image((20, 20)))
+        self.assertFormError(response, 'form', 'image',
+                             'Изображение больше 0 мегапикселей.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=10)
+    def test_image_downscaled(self):
+        """Картинка уменьшается до максимального размера стороны."""
+        self.post_image(self.get_image((40, 20)))
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/photo.jpg')
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (10, 5))
+            self.assertEqual(image.format, 'JPEG')
+
+    def test_small_image_saved_as_is(self):
+        """Картинку без уменьшения и поворота не пересжимают."""
+        upload = self.get_image((40, 20))
+        content = upload.read()
+        upload.seek(0)
+        self.post_image(upload)
+        with Post.objects.get().image.open() as image:
+            self.assertEqual(image.read(), content)
+
+    def test_rotated_image_transposed(self):
+        """Повернутую по EXIF картинку пересохраняют уже повернутой."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20), 'red').save(buffer, 'JPEG',
+                                               exif=exif.tobytes())
+        self.post_image(SimpleUploadedFile('photo.jpg', buffer.getvalue()))
+        with Image.open(Post.objects.get().image) as image:
+            self.assertEqual(image.size, (20, 40))
+
+    @override_settings(POST_IMAGE_MAX_SIDE=10)
+    def test_animation_saved_as_is(self):
+        buffer = BytesIO()
+        frames = [Image.new('P', (40, 20), color) for color in (1, 2)]
+        frames[0].save(buffer, 'GIF', save_all=True,
+                       append_images=frames[1:])
+        self.post_image(SimpleUploadedFile('anim.gif', buffer.getvalue()))
+        with Image.open(Post.objects.get().image) as image:
+            self.assertEqual(image.size, (40, 20))
+            self.assertTrue(image.is_animated)
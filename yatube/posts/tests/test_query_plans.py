@@ -0,0 +1,92 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FEED_TABLES = ('posts_post', 'posts_comment', 'posts_follow',
+               'posts_timelineentry')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'планы запросов SQLite')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'Пост {number}')
+            for number in range(15)
+        )
+        cls.post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.reader, text=f'Корень {number}')
+            for number in range(25)
+        )
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, parent=root,
+                    text='Ответ')
+            for root in Comment.objects.all()[:5]
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def plans(self, url, context_name):
+        """Планы запросов к таблицам лент для первой страницы, первой
+        страницы курсором и следующей за ней."""
+        response = self.client.get(url, {'cursor': ''})
+        pages = [{}, {'cursor': ''},
+                 {'cursor': response.context[context_name].next_cursor}]
+        plans = []
+        for params in pages:
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(url, params)
+            for query in context.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or not any(
+                    f'"{table}"' in sql for table in FEED_TABLES
+                ):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                    plans.append((sql, [row[3] for row in cursor]))
+        return plans
+
+    def test_feeds_read_by_index(self):
+        """Ленты читаются по индексу и не сортируются во временном B-tree."""
+        feeds = {
+            reverse('posts:main'): 'page_obj',
+            reverse('posts:group_detail', args=[self.group.slug]): 'page_obj',
+            reverse('posts:profile', args=[self.author.username]): 'page_obj',
+            reverse('posts:follow_index'): 'page_obj',
+            reverse('posts:post_detail', args=[self.post.pk]): 'comments',
+            reverse('posts:post_comments', args=[self.post.pk]): 'comments',
+        }
+        for url, context_name in feeds.items():
+            plans = self.plans(url, context_name)
+            self.assertTrue(plans)
+            for sql, plan in plans:
+                with self.subTest(url=url, sql=sql):
+                    for step in plan:
+                        # Старые SQLite пишут «SCAN TABLE t».
+                        step = step.replace('SCAN TABLE ', 'SCAN ')
+                        self.assertNotIn('TEMP B-TREE', step)
+                        if step.startswith('SCAN ') and (
+                            step.split()[1] in FEED_TABLES
+                        ):
+                            self.assertIn('INDEX', step)
@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post
+from ..search import stem
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+        self.one = Post.objects.create(author=self.user,
+                                       text='Прочитал интересную книгу')
+        self.many = Post.objects.create(author=self.user,
+                                        text='Книги, книги и еще раз книги')
+        self.other = Post.objects.create(author=self.user,
+                                         text='Сегодня была хорошая погода')
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_stem(self):
+        """Формы одного слова сводятся к одной основе."""
+        for word in ('книга', 'книги', 'книгой', 'книгами'):
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), 'книг')
+
+    def test_ranked_results(self):
+        """Результаты упорядочены по релевантности."""
+        self.assertEqual(self.search('книгами'),
+                         [self.many, self.one])
+
+    def test_index_updated_on_edit(self):
+        """Индекс обновляется при изменении поста."""
+        self.other.text = 'Погода испортилась, читаю книгу'
+        self.other.save()
+        self.assertIn(self.other, self.search('книга'))
+        self.assertEqual(self.search('хорошая'), [])
+
+    def test_deleted_post_not_found(self):
+        self.one.delete()
+        self.assertEqual(self.search('интересная'), [])
+
+    def test_empty_query(self):
+        self.assertEqual(self.search(''), [])
+
+
+class AdminSearchTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin'
+        )
+        self.client.force_login(self.admin)
+        self.post = Post.objects.create(author=self.admin,
+                                        text='Прочитал интересную книгу')
+        self.other = Post.objects.create(author=self.admin,
+                                         text='Хорошая погода')
+        self.comment = Comment.objects.create(post=self.other,
+                                              author=self.admin,
+                                              text='Согласен насчет погоды')
+
+    def test_post_changelist_search(self):
+        """Поиск постов в админке идет по индексу с учетом форм слова."""
+        response = self.client.get(reverse('admin:posts_post_changelist'),
+                                   {'q': 'книги'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.post])
+
+    def test_comment_changelist_search(self):
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'погода'}
+        )
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.comment])
+
+    def test_changelist_search_matches_all_words(self):
+        """Как и поиск админки Django, требует каждое слово запроса."""
+        response = self.client.get(reverse('admin:posts_post_changelist'),
+                                   {'q': 'хорошая книга'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+        response = self.client.get(reverse('admin:posts_post_changelist'),
+                                   {'q': 'интересные книги'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.post])
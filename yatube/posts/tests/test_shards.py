@@ -0,0 +1,206 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import search, shards
+from ..models import Comment, Follow, Post, SearchEntry
+
+User = get_user_model()
+
+SHARDS = ['shard0', 'shard1']
+
+
+@override_settings(POST_SHARDS=SHARDS, QUERY_BUDGET_RAISE=False)
+class ShardTests(TestCase):
+    databases = {'default', *SHARDS}
+
+    @classmethod
+    def setUpClass(cls):
+        # Шарды — отдельные файлы SQLite со схемой проекта.
+        cls.directory = tempfile.mkdtemp()
+        for alias in SHARDS:
+            connections.databases[alias] = {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.directory, f'{alias}.sqlite3'),
+                'PRAGMAS': {'foreign_keys': 'OFF'},
+            }
+            with override_settings(POST_SHARDS=SHARDS):
+                call_command('migrate', database=alias, verbosity=0)
+            # migrate снова включил внешние ключи в этом соединении.
+            connections[alias].close()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in SHARDS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+        shutil.rmtree(cls.directory)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = User.objects.create_user(username='first')
+        cls.second = User.objects.create_user(username='second')
+        cls.reader = User.objects.create_user(username='reader')
+        start = timezone.now() - timedelta(days=1)
+        cls.posts = []
+        for number in range(12):
+            author = (cls.first, cls.second)[number % 2]
+            post = Post.objects.create(author=author,
+                                       text=f'Пост номер {number}')
+            # Даты постов разных шардов чередуются.
+            Post.objects.shard_of(post.pk).filter(pk=post.pk).update(
+                pub_date=start + timedelta(minutes=number)
+            )
+            cls.posts.append(post)
+        cls.newest = cls.posts[::-1]
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def _should_check_constraints(self, connection):
+        # В шардах нет пользователей, на которых ссылаются посты.
+        return (connection.alias not in SHARDS
+                and super()._should_check_constraints(connection))
+
+    def page_posts(self, url, **params):
+        response = self.client.get(url, params)
+        return list(response.context['page_obj']), response
+
+    def test_posts_stored_in_author_shard(self):
+        """Пост лежит в шарде автора, а его id указывает на шард."""
+        self.assertNotEqual(shards.for_author(self.first.pk),
+                            shards.for_author(self.second.pk))
+        for post in self.posts:
+            alias = shards.for_author(post.author_id)
+            self.assertEqual(shards.for_pk(post.pk), alias)
+            self.assertTrue(
+                Post.objects.using(alias).filter(pk=post.pk).exists()
+            )
+        self.assertFalse(Post.objects.using('default').exists())
+
+    def test_pk_allocated_in_shard_transaction(self):
+        """id нового поста выбирается в одной транзакции с INSERT."""
+        alias = shards.for_author(self.first.pk)
+        with mock.patch.object(shards.transaction, 'atomic',
+                               wraps=transaction.atomic) as atomic:
+            post = Post.objects.create(author=self.first, text='Новый пост')
+        atomic.assert_any_call(using=alias)
+        self.assertEqual(shards.for_pk(post.pk), alias)
+
+    def test_index_merges_shards(self):
+        """Главная сливает шарды по дате, по номеру и по курсору."""
+        url = reverse('posts:main')
+        first_page, _ = self.page_posts(url)
+        second_page, _ = self.page_posts(url, page=2)
+        self.assertEqual(first_page + second_page, self.newest)
+        cursor_page, response = self.page_posts(url, cursor='')
+        self.assertEqual(cursor_page, first_page)
+        next_page, _ = self.page_posts(
+            url, cursor=response.context['page_obj'].next_cursor
+        )
+        self.assertEqual(next_page, second_page)
+
+    def test_profile_reads_author_shard(self):
+        """Профиль показывает посты автора из его шарда."""
+        posts, _ = self.page_posts(
+            reverse('posts:profile', args=[self.second.username])
+        )
+        self.assertEqual(posts, [post for post in self.newest
+                                 if post.author == self.second][:10])
+
+    def test_comment_stored_with_post(self):
+        """Комментарий живет в шарде поста и виден на его странице."""
+        post = self.posts[1]
+        self.client.post(reverse('posts:add_comment', args=[post.pk]),
+                         {'text': 'Комментарий читателя'})
+        alias = shards.for_pk(post.pk)
+        comment = Comment.objects.using(alias).get()
+        self.assertEqual(comment.author_id, self.reader.pk)
+        self.assertEqual(shards.for_pk(comment.pk), alias)
+        self.assertEqual(
+            Post.objects.using(alias).get(pk=post.pk).comments_count, 1
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        self.assertEqual(response.context['post'], post)
+        self.assertEqual(list(response.context['comments']), [comment])
+
+    def test_follow_feed_merges_shards(self):
+        """Лента подписок собирается из шардов всех авторов."""
+        for author in (self.first, self.second):
+            Follow.objects.create(user=self.reader, author=author)
+        posts, _ = self.page_posts(reverse('posts:follow_index'))
+        self.assertEqual(posts, self.newest[:10])
+
+    def test_search_merges_shards(self):
+        """Поиск находит посты во всех шардах."""
+        posts, _ = self.page_posts(reverse('posts:search'), q='номер')
+        self.assertEqual(set(posts), set(self.newest[:10]))
+
+    def test_merged_slices(self):
+        """Срез слитой выборки равен срезу общей ленты."""
+        posts = shards.across(Post.objects.all())
+        self.assertEqual(posts.count(), 12)
+        self.assertEqual(posts[3:7], self.newest[3:7])
+        self.assertEqual(posts[5], self.newest[5])
+
+    def test_delete_post_in_shard(self):
+        """Пост удаляется из шарда вместе с комментариями."""
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        alias = shards.for_pk(post.pk)
+        Post.objects.shard_of(post.pk).get(pk=post.pk).delete()
+        self.assertFalse(Post.objects.using(alias).filter(pk=post.pk).exists())
+        self.assertFalse(Comment.objects.using(alias).exists())
+
+    def test_delete_user_deletes_sharded_content(self):
+        """Удаление пользователя убирает его посты и комментарии из шардов."""
+        leaving = User.objects.create_user(username='leaving')
+        Post.objects.create(author=leaving, text='Пост уходящего')
+        Comment.objects.create(post=self.posts[1], author=leaving,
+                               text='Комментарий уходящего')
+        leaving.delete()
+        self.assertEqual(shards.across(Post.objects.all()).count(), 12)
+        self.assertFalse(shards.across(Comment.objects.all()).exists())
+        posts, _ = self.page_posts(reverse('posts:main'))
+        self.assertEqual(posts, self.newest[:10])
+
+    def test_recount_counters_sums_shards(self):
+        """Пересчет счетчиков учитывает посты и комментарии в шардах."""
+        post = self.posts[0]
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        call_command('recount_counters', stdout=StringIO())
+        self.first.profile.refresh_from_db()
+        self.assertEqual(self.first.profile.posts_count, 6)
+        self.assertEqual(
+            Post.objects.shard_of(post.pk).get(pk=post.pk).comments_count, 1
+        )
+
+    def test_rebuild_search_index_in_shards(self):
+        """Индекс перестраивается в шардах, а не в основной базе."""
+        before = search.size()
+        self.assertGreater(before, 0)
+        output = StringIO()
+        call_command('rebuild_search_index', stdout=output)
+        self.assertEqual(search.size(), before)
+        self.assertIn(str(before), output.getvalue())
+        self.assertFalse(SearchEntry.objects.using('default').exists())
+        posts, _ = self.page_posts(reverse('posts:search'), q='номер')
+        self.assertEqual(len(posts), 10)
@@ -0,0 +1,102 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.core.files.storage import default_storage
+
+from .. import renditions
+from ..models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+IMAGE = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.client.force_login(self.user)
+
+    def create_post(self):
+        uploaded = SimpleUploadedFile(name='small.gif', content=IMAGE,
+                                      content_type='image/gif')
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'Пост с картинкой', 'image': uploaded})
+        return Post.objects.get()
+
+    @override_settings(THUMBNAIL_WORKERS=1)
+    def test_placeholder_until_generated(self):
+        """Пока версии не готовы, лента показывает заглушку."""
+        post = self.create_post()
+        self.assertEqual(post.image_digest, '')
+        response = self.client.get(reverse('posts:main'))
+        self.assertContains(response, 'aspect-ratio')
+        self.assertNotContains(response, '<picture>')
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_renditions_generated_on_create(self):
+        """Версии всех ширин и форматов создаются после сохранения."""
+        post = self.create_post()
+        self.assertEqual(len(post.image_digest), 64)
+        for width in settings.POST_IMAGE_WIDTHS:
+            for image_format in renditions.formats():
+                with self.subTest(width=width, format=image_format):
+                    self.assertTrue(default_storage.exists(renditions.name(
+                        post.image_digest, width, image_format
+                    )))
+        response = self.client.get(reverse('posts:main'))
+        self.assertNotContains(response, 'aspect-ratio')
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, renditions.fallback_url(
+            post.image_digest
+        ))
+        self.assertContains(response, f'{max(settings.POST_IMAGE_WIDTHS)}w')
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_renditions_are_content_addressed(self):
+        """Та же картинка не создает версии повторно."""
+        post = self.create_post()
+        path = renditions.name(post.image_digest,
+                               settings.POST_IMAGE_WIDTHS[0],
+                               renditions.FALLBACK_FORMAT)
+        modified = default_storage.get_modified_time(path)
+        self.assertEqual(renditions.generate(post.image.name),
+                         post.image_digest)
+        self.assertEqual(default_storage.get_modified_time(path), modified)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_feed_does_not_generate_renditions(self):
+        """Лента не создает версии в процессе ответа, это делает команда."""
+        post = Post.objects.create(
+            author=self.user, text='Пост',
+            image=SimpleUploadedFile(name='small.gif', content=IMAGE,
+                                     content_type='image/gif'),
+        )
+        response = self.client.get(reverse('posts:main'))
+        self.assertContains(response, 'aspect-ratio')
+        post.refresh_from_db()
+        self.assertEqual(post.image_digest, '')
+        call_command('generate_renditions', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(len(post.image_digest), 64)
@@ -0,0 +1,127 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Старый пост')
+
+    def timeline_posts(self):
+        return list(TimelineEntry.objects.filter(
+            user=TimelineTests.reader
+        ).values_list('post_id', flat=True))
+
+    def test_follow_backfills_timeline(self):
+        """Подписка переносит старые посты автора в ленту."""
+        Follow.objects.create(user=TimelineTests.reader,
+                              author=TimelineTests.author)
+        self.assertEqual(self.timeline_posts(), [TimelineTests.post.pk])
+
+    def test_new_post_pushed_to_followers(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=TimelineTests.reader,
+                              author=TimelineTests.author)
+        post = Post.objects.create(author=TimelineTests.author,
+                                   text='Новый пост')
+        self.assertEqual(self.timeline_posts(),
+                         [post.pk, TimelineTests.post.pk])
+
+    def test_unfollow_trims_timeline(self):
+        """Отписка убирает посты автора из ленты."""
+        Follow.objects.create(user=TimelineTests.reader,
+                              author=TimelineTests.author)
+        Follow.objects.filter(user=TimelineTests.reader).delete()
+        self.assertEqual(self.timeline_posts(), [])
+
+    def test_deleted_post_leaves_timeline(self):
+        """Удаленный пост пропадает из лент подписчиков."""
+        Follow.objects.create(user=TimelineTests.reader,
+                              author=TimelineTests.author)
+        post = Post.objects.create(author=TimelineTests.author,
+                                   text='Удаляемый пост')
+        post.delete()
+        self.assertEqual(self.timeline_posts(), [TimelineTests.post.pk])
+
+    def test_rebuild_command(self):
+        """Команда rebuild_timelines восстанавливает ленты."""
+        Follow.objects.create(user=TimelineTests.reader,
+                              author=TimelineTests.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.timeline_posts(), [TimelineTests.post.pk])
+
+
+@override_settings(FOLLOW_FEED_PULL_THRESHOLD=1)
+class HybridTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.star = User.objects.create_user(username='star')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=cls.fan, author=cls.star)
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(HybridTimelineTests.reader)
+
+    def test_popular_author_not_pushed(self):
+        """Посты автора выше порога не раскладываются по лентам."""
+        Post.objects.create(author=HybridTimelineTests.star, text='Звезда')
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_feed_merges_pushed_and_pulled_posts(self):
+        """Лента объединяет разложенные и подмешанные посты по дате."""
+        first = Post.objects.create(author=HybridTimelineTests.author,
+                                    text='Первый')
+        second = Post.objects.create(author=HybridTimelineTests.star,
+                                     text='Второй')
+        third = Post.objects.create(author=HybridTimelineTests.author,
+                                    text='Третий')
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [third, second, first])
+
+    def test_unfollow_below_threshold_pushes_pulled_posts(self):
+        """Автор вернулся к порогу: его посты появляются в лентах."""
+        post = Post.objects.create(author=HybridTimelineTests.star,
+                                   text='Звезда')
+        Follow.objects.filter(user=HybridTimelineTests.fan).delete()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=HybridTimelineTests.reader, post=post
+        ).exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    @override_settings(FOLLOW_FEED_PULL_THRESHOLD=2)
+    def test_catch_up_fills_newcomers(self):
+        """Новый подписчик «тяжелого» автора получает и старые посты."""
+        rising = User.objects.create_user(username='rising')
+        newcomer = User.objects.create_user(username='newcomer')
+        Follow.objects.create(user=HybridTimelineTests.reader, author=rising)
+        Follow.objects.create(user=HybridTimelineTests.fan, author=rising)
+        old = Post.objects.create(author=rising, text='До')
+        Follow.objects.create(user=newcomer, author=rising)
+        new = Post.objects.create(author=rising, text='После')
+        Follow.objects.filter(user=HybridTimelineTests.fan,
+                              author=rising).delete()
+        for user in (HybridTimelineTests.reader, newcomer):
+            with self.subTest(user=user.username):
+                self.assertEqual(set(TimelineEntry.objects.filter(
+                    user=user, author=rising
+                ).values_list('post_id', flat=True)), {old.pk, new.pk})
@@ -1,15 +1,25 @@
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection
+from core import purge
+from core.cache import fragment_cache
+from core.test_runner import on_commit_callbacks
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Follow, Group, Post
+from ..models import Comment, Follow, Group, Post
+from ..templatetags import post_cards
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -267,26 +277,52 @@ class PostsViewsTests(TestCase):
     def test_cache(self):
         """Проверка работы кэша"""
         cache.clear()
-        created_post = Post.objects.create(
-            author=PostsViewsTests.user,
-            text='testing',
-            image=PostsViewsTests.uploaded
-        )
-        cache.set('1', created_post)
+        with on_commit_callbacks():
+            created_post = Post.objects.create(
+                author=PostsViewsTests.user,
+                text='testing',
+                image=PostsViewsTests.uploaded
+            )
         response = self.client.get(reverse('posts:main'))
         self.assertTrue(created_post.text in response.content.decode('utf-8'))
-        post2 = Post.objects.create(
-            author=PostsViewsTests.user,
-            text='testing2',
-            image=PostsViewsTests.uploaded
-        )
-        cache.set('2', post2)
+        # Изменение в обход сигналов не видно, пока фрагмент в кэше.
+        Post.objects.filter(pk=created_post.pk).update(text='updated')
         response = self.client.get(reverse('posts:main'))
-        self.assertFalse(post2.text in response.content.decode('utf-8'))
-        cache.clear()
-        cache.set('3', post2)
+        self.assertFalse('updated' in response.content.decode('utf-8'))
+        with on_commit_callbacks():
+            post2 = Post.objects.create(
+                author=PostsViewsTests.user,
+                text='testing2',
+                image=PostsViewsTests.uploaded
+            )
         response = self.client.get(reverse('posts:main'))
         self.assertTrue(post2.text in response.content.decode('utf-8'))
+        # Карточка перерисовывается, когда меняется ее ключ: здесь — с
+        # появлением версий картинки.
+        with on_commit_callbacks():
+            call_command('generate_renditions', stdout=StringIO())
+        response = self.client.get(reverse('posts:main'))
+        self.assertTrue('updated' in response.content.decode('utf-8'))
+
+    def test_comment_invalidates_feed_cache(self):
+        """Новый комментарий сбрасывает кэш ленты группы и профиля"""
+        cache.clear()
+        urls = (
+            reverse('posts:group_detail',
+                    kwargs={'slug': PostsViewsTests.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': PostsViewsTests.user.username}),
+        )
+        for url in urls:
+            self.client.get(url)
+        with on_commit_callbacks():
+            Comment.objects.create(post=PostsViewsTests.post,
+                                   author=PostsViewsTests.user,
+                                   text='Комментарий')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Комментариев: 1')
 
 
 class PaginatorTests(TestCase):
@@ -350,3 +386,436 @@ class PaginatorTests(TestCase):
                                            PaginatorTests.user.username})
                                    + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_cursor_pages(self):
+        """Курсорная пагинация: следующая и предыдущая страницы."""
+        response = self.client.get(reverse('posts:main') + '?cursor=')
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), 10)
+        self.assertFalse(first_page.has_previous())
+        response = self.client.get(reverse('posts:main'),
+                                   {'cursor': first_page.next_cursor})
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        response = self.client.get(reverse('posts:main'),
+                                   {'cursor': second_page.previous_cursor})
+        self.assertEqual(list(response.context['page_obj']),
+                         list(first_page))
+
+    def test_cursor_page_without_count(self):
+        """Курсорная страница не выполняет COUNT(*)."""
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('posts:group_detail',
+                                    kwargs={'slug': PaginatorTests.group.slug})
+                            + '?cursor=')
+        queries = ' '.join(query['sql'] for query in context.captured_queries)
+        self.assertNotIn('COUNT(*)', queries)
+
+    def test_invalid_cursor_returns_first_page(self):
+        response = self.client.get(reverse('posts:main') + '?cursor=bad')
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+class FeedQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test',
+            slug='test-slug',
+            description='Тестовый текст',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(FeedQueriesTests.reader)
+
+    def create_posts(self, count):
+        for _ in range(count):
+            post = Post.objects.create(author=FeedQueriesTests.user,
+                                       text='Тестовый пост',
+                                       group=FeedQueriesTests.group)
+            Comment.objects.create(post=post, author=FeedQueriesTests.reader,
+                                   text='Комментарий')
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.authorized_client.get(url)
+        return len(context.captured_queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов ленты не зависит от числа постов на странице."""
+        urls = (
+            reverse('posts:main'),
+            reverse('posts:group_detail',
+                    kwargs={'slug': FeedQueriesTests.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': FeedQueriesTests.user.username}),
+            reverse('posts:follow_index'),
+        )
+        self.create_posts(1)
+        expected = {url: self.count_queries(url) for url in urls}
+        self.create_posts(9)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), expected[url])
+
+
+class PostCardTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        for number in range(3):
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(PostCardTests.reader)
+
+    def posts(self):
+        return list(Post.objects.for_feed())
+
+    def test_page_cards_read_with_one_get_many(self):
+        """Карточки страницы читаются одним get_many и рисуются один раз."""
+        with mock.patch.object(fragment_cache(), 'get_many',
+                               wraps=fragment_cache().get_many) as get_many, \
+                mock.patch.object(post_cards, 'get_template',
+                                  wraps=post_cards.get_template) as render:
+            self.assertEqual(len(post_cards.post_cards(self.posts())), 3)
+            self.assertEqual(get_many.call_count, 1)
+            self.assertEqual(render.call_count, 3)
+            post_cards.post_cards(self.posts())
+            self.assertEqual(get_many.call_count, 2)
+            self.assertEqual(render.call_count, 3)
+
+    def test_feeds_share_cards(self):
+        """Лента подписок собирается из карточек, закэшированных главной."""
+        self.client.get(reverse('posts:main'))
+        post = self.posts()[0]
+        fragment_cache().set(post_cards.card_key(post), 'Карточка из кэша')
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Карточка из кэша')
+
+    def test_card_key_follows_post_version(self):
+        """Комментарий и правка поста меняют ключ его карточки."""
+        post = self.posts()[0]
+        key = post_cards.card_key(post)
+        Comment.objects.create(post=post, author=PostCardTests.reader,
+                               text='Комментарий')
+        post.refresh_from_db()
+        self.assertNotEqual(post_cards.card_key(post), key)
+        key = post_cards.card_key(post)
+        post.text = 'Исправленный пост'
+        post.save()
+        self.assertNotEqual(post_cards.card_key(post), key)
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(25)
+        )
+
+    def test_detail_shows_first_page_of_comments(self):
+        """На странице поста только первая страница комментариев."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 20)
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, comments.next_cursor)
+
+    def test_more_comments_fragment(self):
+        """Фрагмент по курсору содержит оставшиеся комментарии."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        cursor = response.context['comments'].next_cursor
+        response = self.client.get(url, {'cursor': cursor})
+        self.assertTemplateUsed(response, 'includes/comments.html')
+        self.assertEqual(len(response.context['comments']), 5)
+        self.assertNotContains(response, 'Показать еще')
+
+        response = self.client.get(url, {'cursor': cursor, 'format': 'json'})
+        data = response.json()
+        self.assertEqual(len(data['comments']), 5)
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(data['comments'][0]['author'], self.user.username)
+
+    def test_comments_of_missing_post(self):
+        response = self.client.get(reverse('posts:post_comments', args=[0]))
+        self.assertEqual(response.status_code, 404)
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(CommentThreadTests.user)
+
+    def reply(self, text, parent=None, post=None):
+        post = post or CommentThreadTests.post
+        data = {'text': text}
+        if parent is not None:
+            data['parent'] = parent.pk
+        return self.authorized_client.post(
+            reverse('posts:add_comment', args=[post.pk]), data
+        )
+
+    def test_reply_to_comment(self):
+        """Ответ сохраняется в ветке родителя."""
+        self.reply('Корень')
+        root = Comment.objects.get()
+        self.reply('Ответ', parent=root)
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual(reply.parent, root)
+        self.assertEqual(reply.depth, 1)
+        self.assertTrue(reply.path.startswith(root.path))
+        self.assertEqual(list(Comment.objects.subtree(root)), [root, reply])
+
+    def test_reply_to_comment_of_other_post(self):
+        other = Post.objects.create(author=CommentThreadTests.user,
+                                    text='Другой пост')
+        self.reply('Корень', post=other)
+        response = self.reply('Ответ', parent=Comment.objects.get())
+        self.assertEqual(response.status_code, 404)
+
+    def test_threads_order(self):
+        """Новые ветки первыми, ответы — деревом под своим корнем."""
+        self.reply('Первый')
+        first = Comment.objects.get(text='Первый')
+        self.reply('Второй')
+        self.reply('Ответ', parent=first)
+        self.reply('Ответ на ответ', parent=Comment.objects.get(text='Ответ'))
+        self.reply('Еще ответ', parent=first)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[CommentThreadTests.post.pk])
+        )
+        shown = [(comment.text, comment.depth)
+                 for comment in response.context['comments']]
+        self.assertEqual(shown, [
+            ('Второй', 0),
+            ('Первый', 0),
+            ('Ответ', 1),
+            ('Ответ на ответ', 2),
+            ('Еще ответ', 1),
+        ])
+
+    def test_thread_queries_do_not_depend_on_replies(self):
+        """Ветки загружаются одним запросом при любой глубине."""
+        url = reverse('posts:post_comments',
+                      args=[CommentThreadTests.post.pk])
+        self.reply('Корень')
+        parent = Comment.objects.get()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        for number in range(5):
+            self.reply(f'Ответ {number}', parent=parent)
+            parent = Comment.objects.get(text=f'Ответ {number}')
+        with CaptureQueriesContext(connection) as deep_context:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['comments']), 6)
+        self.assertEqual(len(deep_context.captured_queries),
+                         len(context.captured_queries))
+
+    def test_long_thread_split_across_pages(self):
+        """Страница ограничена вместе с ответами, ветка продолжается."""
+        self.reply('Старый корень')
+        self.reply('Корень')
+        root = Comment.objects.get(text='Корень')
+        Comment.objects.bulk_create(
+            Comment(post=CommentThreadTests.post, parent=root,
+                    author=CommentThreadTests.user, text=f'Ответ {number}')
+            for number in range(60)
+        )
+        url = reverse('posts:post_comments',
+                      args=[CommentThreadTests.post.pk])
+        shown = []
+        cursor = ''
+        while cursor is not None:
+            data = self.client.get(url, {'cursor': cursor,
+                                         'format': 'json'}).json()
+            self.assertLessEqual(len(data['comments']), 20)
+            shown += [comment['text'] for comment in data['comments']]
+            cursor = data['next_cursor']
+        self.assertEqual(shown, [
+            'Корень', *(f'Ответ {number}' for number in range(60)),
+            'Старый корень',
+        ])
+
+    def test_bulk_created_comments_get_paths(self):
+        Comment.objects.bulk_create(
+            Comment(post=CommentThreadTests.post,
+                    author=CommentThreadTests.user, text='Комментарий')
+            for _ in range(3)
+        )
+        for comment in Comment.objects.all():
+            self.assertEqual(comment.path, f'{comment.pk:010d}/')
+            self.assertEqual(comment.thread_key,
+                             f'{9999999999 - comment.pk:010d}/')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(ConditionalGetTests.reader)
+
+    def assertNotModified(self, client, url):
+        etag = client.get(url)['ETag']
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        return etag
+
+    def test_pages_not_modified(self):
+        urls = (
+            reverse('posts:main'),
+            reverse('posts:profile',
+                    kwargs={'username': ConditionalGetTests.user.username}),
+            reverse('posts:post_detail',
+                    kwargs={'post_id': ConditionalGetTests.post.pk}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertNotModified(self.reader_client, url)
+
+    def test_new_post_changes_index(self):
+        url = reverse('posts:main')
+        etag = self.assertNotModified(self.client, url)
+        with on_commit_callbacks():
+            Post.objects.create(author=ConditionalGetTests.user,
+                                text='Новый')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_uncommitted_post_keeps_index(self):
+        """До фиксации транзакции версия ленты не меняется."""
+        url = reverse('posts:main')
+        etag = self.assertNotModified(self.client, url)
+        Post.objects.create(author=ConditionalGetTests.user, text='Новый')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_follow_changes_profile(self):
+        """Подписка меняет счетчики и кнопку на странице профиля."""
+        url = reverse('posts:profile',
+                      kwargs={'username': ConditionalGetTests.user.username})
+        etag = self.assertNotModified(self.reader_client, url)
+        with on_commit_callbacks():
+            Follow.objects.create(user=ConditionalGetTests.reader,
+                                  author=ConditionalGetTests.user)
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        url = reverse('posts:main')
+        self.assertNotEqual(self.client.get(url)['ETag'],
+                            self.reader_client.get(url)['ETag'])
+
+    def test_new_csrf_token_changes_etag(self):
+        """Новый CSRF-токен (вход в систему) обновляет формы страницы."""
+        url = reverse('posts:post_detail',
+                      kwargs={'post_id': ConditionalGetTests.post.pk})
+        etag = self.assertNotModified(self.reader_client, url)
+        self.reader_client.cookies[settings.CSRF_COOKIE_NAME] = 'x' * 64
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(EDGE_PURGE_BACKEND='core.purge.LocmemPurgeBackend')
+class EdgeCacheTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.group = Group.objects.create(title='test', slug='test-slug',
+                                          description='test')
+        self.post = Post.objects.create(author=self.user, text='Пост',
+                                        group=self.group)
+        purge.outbox.clear()
+
+    def test_anonymous_pages_are_public(self):
+        """Страницы для анонимов кэшируются CDN с суррогатными ключами."""
+        response = self.client.get(
+            reverse('posts:group_detail', kwargs={'slug': 'test-slug'})
+        )
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn(f's-maxage={settings.EDGE_CACHE_TIMEOUT}',
+                      response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        self.assertEqual(response['Surrogate-Key'].split(),
+                         ['all', f'group:{self.group.pk}', 'group:test-slug'])
+
+    def test_post_page_has_own_key(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        self.assertEqual(response['Surrogate-Key'].split(),
+                         ['all', f'author:{self.user.pk}',
+                          f'post:{self.post.pk}'])
+
+    def test_authenticated_pages_are_private(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('posts:main'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('Surrogate-Key', response)
+
+    def test_post_change_purges_its_pages(self):
+        """Правка поста сбрасывает ключи лент, где он показан."""
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        self.assertIn(
+            sorted(['index', f'author:{self.user.pk}',
+                    f'group:{self.group.pk}']),
+            purge.outbox,
+        )
+
+    def test_comment_purges_post_pages(self):
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Комментарий')
+        self.assertIn(f'author:{self.user.pk}', sum(purge.outbox, []))
+        self.assertIn([f'post:{self.post.pk}'], purge.outbox)
+
+    def test_group_change_purges_all_pages(self):
+        """Новый адрес группы меняет ссылки на нее во всех лентах."""
+        self.group.slug = 'new-slug'
+        self.group.save()
+        self.assertIn(['all'], purge.outbox)
+        self.assertIn(['group:new-slug', 'group:test-slug'], purge.outbox)
+
+    def test_author_rename_purges_all_pages(self):
+        self.user.first_name = 'Новое имя'
+        self.user.save()
+        self.assertIn(['all'], purge.outbox)
+
+    def test_login_does_not_purge_pages(self):
+        self.client.force_login(self.user)
+        self.assertEqual(purge.outbox, [])
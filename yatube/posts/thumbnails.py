@@ -0,0 +1,119 @@
+"""Фоновая подготовка миниатюр картинок постов.
+
+Версии картинки (см. renditions) создаются в пуле потоков после
+сохранения поста. Пока их нет, у поста пустой image_digest, и шаблон
+показывает заглушку, не тратя время ответа на обработку картинки.
+
+При THUMBNAIL_WORKERS = 0 версии создаются сразу при сохранении поста,
+а недостающие — командой generate_renditions, но не при чтении ленты.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import feed_cache, renditions, shards
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def generate(name):
+    """Создает версии картинки и отмечает ее посты готовыми.
+
+    Возвращает digest картинки или None, если ее не удалось прочитать.
+    """
+    try:
+        digest = renditions.generate(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+        return None
+    shards.across(Post.objects.filter(image=name)).update(
+        image_digest=digest
+    )
+    return digest
+
+
+def _generate_in_worker(name):
+    close_old_connections()
+    try:
+        if generate(name):
+            # Кэшированные ленты показывают заглушку вместо картинки.
+            posts = shards.across(Post.objects.filter(image=name).only(
+                'author_id', 'group_id'
+            ).order_by())
+            for post in posts:
+                feed_cache.bump_post(post)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        close_old_connections()
+
+
+def _submit(name):
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    _get_executor().submit(_generate_in_worker, name)
+
+
+def schedule(name):
+    """Ставит картинку в очередь.
+
+    При THUMBNAIL_WORKERS = 0 версии создаются сразу, и функция
+    возвращает digest; иначе — None.
+    """
+    if not name:
+        return None
+    if not settings.THUMBNAIL_WORKERS:
+        return generate(name)
+    # Воркер должен увидеть уже сохраненные пост и файл.
+    transaction.on_commit(lambda: _submit(name))
+    return None
+
+
+def enqueue(name):
+    """Ставит в фоновую очередь картинку, найденную без версий при чтении.
+
+    В синхронном режиме ничего не делает: версии и UPDATE постов
+    тратили бы время и запросы ответа ленты.
+    """
+    if name and settings.THUMBNAIL_WORKERS:
+        _submit(name)
+
+
+def generate_missing():
+    """Создает версии картинок всех постов, у которых их нет.
+
+    Возвращает число обработанных картинок.
+    """
+    names = {
+        name for queryset in shards.each(
+            Post.objects.filter(image_digest='').exclude(image='')
+        )
+        for name in queryset.values_list('image', flat=True).distinct()
+    }
+    for name in names:
+        generate(name)
+    if names:
+        # Закэшированные ленты показывают заглушки вместо картинок.
+        feed_cache.bump(feed_cache.GLOBAL)
+    return len(names)
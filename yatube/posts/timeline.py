@@ -0,0 +1,183 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Каждый новый пост раскладывается в ленты подписчиков автора, поэтому
+страница подписок читается одним диапазоном по индексу (user, pub_date).
+
+Гибридный режим: посты авторов, у которых подписчиков больше
+settings.FOLLOW_FEED_PULL_THRESHOLD, не раскладываются по лентам,
+а подмешиваются при чтении. Когда отписка возвращает автора к порогу,
+его посты, вышедшие без раскладки, дописываются в ленты подписчиков
+(catch_up).
+
+При шардировании постов (posts.shards) записи ленты не могут ссылаться
+на посты из другой базы: ленты не раскладываются, а лента подписок
+собирается при чтении из постов авторов во всех шардах.
+"""
+from itertools import chain, islice
+
+from django.conf import settings
+from django.db.models import Count, F, Max, Q
+
+from . import shards
+from .models import Follow, Post, TimelineEntry
+
+BATCH_SIZE = 500
+# Поля курсора ленты подписок (см. feed).
+CURSOR_FIELDS = ('feed_date', 'feed_pk')
+
+
+def _entries(user_id, posts):
+    return (TimelineEntry(user_id=user_id, post_id=post.pk,
+                          author_id=post.author_id, pub_date=post.pub_date)
+            for post in posts)
+
+
+def _insert(entries):
+    """Вставляет записи ленты пачками, не собирая их все в памяти."""
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def pull_threshold():
+    return getattr(settings, 'FOLLOW_FEED_PULL_THRESHOLD', None)
+
+
+def is_pulled(author_id):
+    """Читаются ли посты автора при запросе, а не из ленты."""
+    threshold = pull_threshold()
+    if threshold is None:
+        return False
+    return Follow.objects.filter(author_id=author_id).count() > threshold
+
+
+def pulled_authors(user):
+    """Авторы из подписок пользователя, превысившие порог подписчиков."""
+    threshold = pull_threshold()
+    if threshold is None:
+        return []
+    followed = Follow.objects.filter(user=user).values('author_id')
+    return list(Follow.objects.filter(
+        author_id__in=followed
+    ).values('author_id').annotate(
+        followers=Count('pk')
+    ).filter(followers__gt=threshold).values_list('author_id', flat=True))
+
+
+def feed(user):
+    """Посты ленты подписок: своя лента плюс посты «тяжелых» авторов.
+
+    Выборка упорядочена по аннотациям CURSOR_FIELDS. Без «тяжелых»
+    авторов это поля записи ленты, и страница читается диапазоном
+    индекса (user, -pub_date, -post) без сортировки.
+    """
+    if shards.enabled():
+        authors = list(Follow.objects.filter(user=user).values_list(
+            'author_id', flat=True
+        ))
+        return shards.across(Post.objects.filter(
+            author_id__in=authors
+        ).annotate(
+            feed_date=F('pub_date'), feed_pk=F('pk'),
+        ).order_by('-feed_date', '-feed_pk'))
+    pulled = pulled_authors(user)
+    if not pulled:
+        posts = Post.objects.filter(timeline__user=user).annotate(
+            feed_date=F('timeline__pub_date'), feed_pk=F('timeline__post'),
+        )
+    else:
+        inbox = TimelineEntry.objects.filter(user=user).values('post_id')
+        posts = Post.objects.filter(
+            Q(pk__in=inbox) | Q(author_id__in=pulled)
+        ).annotate(feed_date=F('pub_date'), feed_pk=F('pk'))
+    return posts.order_by('-feed_date', '-feed_pk')
+
+
+def push_post(post):
+    """Добавляет пост в ленты всех подписчиков автора."""
+    if shards.enabled() or is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    _insert(chain.from_iterable(
+        _entries(user_id, [post]) for user_id in followers.iterator()
+    ))
+
+
+def backfill(user_id, author_id):
+    """Переносит посты автора в ленту нового подписчика."""
+    if shards.enabled() or is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).only(
+        'pk', 'author_id', 'pub_date'
+    ).order_by()
+    TimelineEntry.objects.bulk_create(
+        _entries(user_id, posts.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill_followers(author_ids):
+    """Раскладывает все посты авторов по лентам их подписчиков."""
+    follows = Follow.objects.filter(
+        author_id__in=author_ids
+    ).values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        backfill(user_id, author_id)
+
+
+def catch_up(author_id):
+    """Дописывает в ленты подписчиков посты, вышедшие без раскладки.
+
+    Последний разложенный пост автора отмечает, с какого момента его
+    посты подмешивались при чтении: дописываются только более новые.
+    Подписчики, пришедшие за это время, не получили и старых постов
+    (см. backfill) — им переносятся все посты автора.
+    """
+    pushed = TimelineEntry.objects.filter(author_id=author_id)
+    last = pushed.aggregate(last=Max('post_id'))['last']
+    followers = Follow.objects.filter(author_id=author_id)
+    # Подписчиков не больше порога; запоминаем новичков до вставки.
+    user_ids = list(followers.values_list('user_id', flat=True))
+    newcomers = list(followers.exclude(
+        user_id__in=pushed.values('user_id')
+    ).values_list('user_id', flat=True))
+    posts = Post.objects.filter(author_id=author_id).only(
+        'pk', 'author_id', 'pub_date'
+    ).order_by()
+    if last is not None:
+        missed = list(posts.filter(pk__gt=last))
+        _insert(chain.from_iterable(
+            _entries(user_id, missed) for user_id in user_ids
+        ))
+        posts = posts.filter(pk__lte=last)
+    for user_id in newcomers:
+        _insert(_entries(user_id, posts.iterator()))
+
+
+def trim(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя.
+
+    Если автор перестал подмешиваться при чтении, его пропущенные посты
+    раскладываются по лентам оставшихся подписчиков.
+    """
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
+    threshold = pull_threshold()
+    if threshold is not None and Follow.objects.filter(
+        author_id=author_id
+    ).count() == threshold:
+        catch_up(author_id)
+
+
+def rebuild():
+    """Пересобирает все ленты с нуля по таблице подписок."""
+    TimelineEntry.objects.all().delete()
+    follows = Follow.objects.values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        backfill(user_id, author_id)
@@ -10,12 +10,15 @@ urlpatterns = [path('', views.index, name='main'),
                     name='group_detail'),
                path('profile/<str:username>/',
                     views.profile, name='profile'),
+               path('search/', views.post_search, name='search'),
                path('posts/<int:post_id>/',
                     views.post_detail, name='post_detail'),
                path('create/',
                     views.post_create, name='post_create'),
                path('posts/<int:post_id>/edit/',
                     views.post_edit, name='post_edit'),
+               path('posts/<int:post_id>/comments/',
+                    views.post_comments, name='post_comments'),
                path('posts/<int:post_id>/comment/',
                     views.add_comment, name='add_comment'),
                path('follow/', views.follow_index, name='follow_index'),
@@ -1,48 +1,67 @@
+from core.paginators import CursorPage, paginate
+from core.query_budget import query_budget
+from core.replicas import read_replica
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from . import feed_cache, search, shards, thumbnails, timeline
+from .conditional import (conditional, follow_scopes, group_keys,
+                          group_scopes, index_scopes, post_keys, post_scopes,
+                          profile_scopes, recently_changed)
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
 
+COMMENTS_PER_PAGE = 20
 
+
+@conditional(index_scopes)
+@query_budget(5)
+@read_replica(recent=recently_changed(index_scopes))
 def index(request):
     title = 'Последние обновления на сайте'
-    posts = Post.objects.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = shards.across(Post.objects.for_feed())
+    page_obj = paginate(request, posts)
     context = {
         'title': title,
         'page_obj': page_obj,
+        'feed_version': feed_cache.version(feed_cache.INDEX),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional(group_scopes, group_keys)
+@query_budget(7)
+@read_replica(recent=recently_changed(group_scopes))
 def group_posts_detail(request, slug):
     group = get_object_or_404(Group, slug=slug)
     title = f'Группа {group}'
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = shards.across(group.posts.for_feed())
+    page_obj = paginate(request, posts)
     context = {
         'title': title,
         'group': group,
         'page_obj': page_obj,
+        'feed_version': feed_cache.version(feed_cache.group_scope(group.pk)),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional(profile_scopes)
+@query_budget(7)
+@read_replica(recent=recently_changed(profile_scopes))
 def profile(request, username):
     title = f'Профайл пользователя {username}'
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(User.objects.select_related('profile'),
+                               username=username)
     user = request.user
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    posts_count = paginator.count
+    post_list = author.posts.for_feed()
+    posts_count = author.profile.posts_count
+    page_obj = paginate(request, post_list, count=posts_count)
     following = user.is_authenticated and Follow.objects.filter(user=user,
                                                                 author=author
                                                                 ).exists()
@@ -51,17 +70,45 @@ def profile(request, username):
         'author': author,
         'post_count': posts_count,
         'following': following,
-        'title': title
+        'title': title,
+        'feed_version': feed_cache.version(
+            feed_cache.author_scope(author.pk)
+        ),
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT,
     }
     return render(request, 'posts/profile.html', context)
 
 
+def comment_threads(request, post):
+    """Страница комментариев в порядке показа.
+
+    На странице не больше COMMENTS_PER_PAGE комментариев вместе с
+    ответами: длинная ветка продолжается на следующей. Курсор — ключ
+    ветки последнего показанного комментария.
+    """
+    cursor = request.GET.get('cursor', '')
+    comments = list(post.comments.filter(
+        thread_key__gt=cursor
+    ).threads()[:COMMENTS_PER_PAGE + 1])
+    page = comments[:COMMENTS_PER_PAGE]
+    has_next = len(comments) > COMMENTS_PER_PAGE
+    return CursorPage(page, None, cursor,
+                      next_cursor=page[-1].thread_key if has_next else None)
+
+
+@conditional(post_scopes, post_keys)
+@query_budget(7)
+@read_replica(recent=recently_changed(post_scopes))
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        shards.select_related(Post.objects.shard_of(post_id),
+                              'author__profile', 'group'),
+        pk=post_id
+    )
     form = CommentForm()
-    comments = post.comments.all()
+    comments = comment_threads(request, post)
     title = f'Пост {post.text[:30]}'
-    posts_count = post.author.posts.count()
+    posts_count = post.author.profile.posts_count
     context = {
         'form': form,
         'comments': comments,
@@ -72,7 +119,49 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(6)
+def post_comments(request, post_id):
+    """Следующая страница комментариев: HTML-фрагмент или JSON."""
+    post = get_object_or_404(Post.objects.shard_of(post_id).only('pk'),
+                             pk=post_id)
+    comments = comment_threads(request, post)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'parent': comment.parent_id,
+                    'depth': comment.depth,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'pub_date': comment.pub_date.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next_cursor': comments.next_cursor,
+        })
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+@query_budget(8)
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    title = f'Поиск: {query}' if query else 'Поиск'
+    page_obj = search.get_page(query, request.GET.get('page'))
+    context = {
+        'title': title,
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     title = 'Новый пост'
     form = PostForm(request.POST or None,
@@ -82,6 +171,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post.image.name)
         return redirect('posts:profile', username=post.author)
     context = {
         'form': form,
@@ -95,14 +185,18 @@ def post_edit(request, post_id):
     template = 'posts/create_post.html'
     is_edit = True
     title = 'Редактировать пост'
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.shard_of(post_id), pk=post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post_id)
     form = PostForm(request.POST or None,
                     files=request.FILES or None,
                     instance=post)
     if form.is_valid():
+        if 'image' in form.changed_data:
+            post.image_digest = ''
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post.image.name)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -114,24 +208,32 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(Post.objects.shard_of(post_id), pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        parent_id = request.POST.get('parent')
+        if parent_id:
+            if not parent_id.isdigit():
+                raise Http404
+            comment.parent = get_object_or_404(post.comments, pk=parent_id)
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@conditional(follow_scopes)
+@query_budget(6)
+@read_replica(recent=recently_changed(follow_scopes))
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
+    posts = timeline.feed(request.user).for_feed()
     title = f'Подписки пользователя {request.user.username}'
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, posts,
+                        cursor_fields=timeline.CURSOR_FIELDS)
     context = {
         'title': title,
         'page_obj': page_obj,
@@ -140,6 +242,7 @@ def follow_index(request):
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
@@ -150,6 +253,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     user = request.user
@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-17 04:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='подписок')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'Профиль',
+                'verbose_name_plural': 'Профили',
+            },
+        ),
+    ]
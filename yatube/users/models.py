@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+
+User = get_user_model()
+
+
+class Profile(models.Model):
+    """Денормализованные счетчики пользователя.
+
+    Обновляются сигналами posts при создании и удалении постов
+    и подписок; расхождения исправляет команда recount_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='profile',
+        verbose_name='пользователь'
+    )
+    posts_count = models.PositiveIntegerField('постов', default=0)
+    followers_count = models.PositiveIntegerField('подписчиков', default=0)
+    following_count = models.PositiveIntegerField('подписок', default=0)
+
+    def __str__(self):
+        return self.user.username
+
+    class Meta:
+        verbose_name = 'Профиль'
+        verbose_name_plural = 'Профили'
@@ -54,10 +54,13 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
     'sorl.thumbnail',
+    'rest_framework',
     'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,13 +96,70 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
+# Профиль базы выбирается переменной окружения YATUBE_DB: default
+# для разработки или production — WAL, чтобы чтение не ждало записи,
+# ожидание блокировки вместо ошибки и соединения, живущие между
+# запросами. Прагмы выполняет core.db при каждом подключении.
+DATABASE_PROFILES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    'production': {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.environ.get('YATUBE_DB_NAME',
+                               os.path.join(BASE_DIR, 'db.sqlite3')),
+        'CONN_MAX_AGE': 600,
+        # Транзакции сразу занимают очередь на запись (core.backends).
+        'TRANSACTION_MODE': 'IMMEDIATE',
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            # В WAL достаточно NORMAL: сбой питания может потерять
+            # последние транзакции, но не испортить базу.
+            'synchronous': 'NORMAL',
+            # Отрицательное значение — размер в КиБ: 64 МиБ.
+            'cache_size': -64000,
+            'mmap_size': 256 * 1024 * 1024,
+            'busy_timeout': 5000,
+            'temp_store': 'MEMORY',
+        },
+    },
 }
 
+DATABASES = {
+    'default': DATABASE_PROFILES[os.environ.get('YATUBE_DB', 'default')],
+}
+
+# Реплика для чтения лент (core.replicas) — путь к копии базы в
+# YATUBE_DB_REPLICA. Без него alias смотрит в основную базу, и роутер
+# читает из нее. После записи пользователь REPLICA_PIN_SECONDS читает
+# из основной базы, пока реплика догоняет.
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': os.environ.get('YATUBE_DB_REPLICA',
+                           DATABASES['default']['NAME']),
+    'TEST': {'MIRROR': 'default'},
+}
+REPLICA_PIN_SECONDS = 10
+
+# Шарды постов и комментариев (posts.shards) — пути к файлам баз через
+# запятую в YATUBE_SHARDS. Без нее посты живут в основной базе.
+# Пользователи и группы в шардах не хранятся: внешние ключи на них
+# там не проверяются.
+POST_SHARDS = []
+for number, name in enumerate(
+    filter(None, os.environ.get('YATUBE_SHARDS', '').split(','))
+):
+    POST_SHARDS.append(f'shard{number}')
+    DATABASES[f'shard{number}'] = {
+        **DATABASES['default'],
+        'NAME': name,
+        'PRAGMAS': {**DATABASES['default'].get('PRAGMAS', {}),
+                    'foreign_keys': 'OFF'},
+    }
+DATABASE_ROUTERS = ['posts.shards.ShardRouter',
+                    'core.replicas.ReplicaRouter']
+
 #  подключаем движок filebased.EmailBackend
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 # указываем директорию, в которую будут складываться файлы писем
@@ -148,10 +208,83 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
+# Загрузки пишутся на диск частями, а не собираются в памяти
+# (core.uploads); файлы больше UPLOAD_MAX_FILE_SIZE отклоняются.
+FILE_UPLOAD_HANDLERS = ['core.uploads.LimitedTemporaryFileUploadHandler']
+UPLOAD_MAX_FILE_SIZE = 10 * 1024 * 1024
+
+# Общий для всех воркеров кэш выбирается переменной окружения
+# YATUBE_CACHE: locmem (по умолчанию, свой у каждого процесса),
+# file (каталог YATUBE_CACHE_LOCATION) или memcached (адрес
+# YATUBE_CACHE_LOCATION).
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION',
+                                   os.path.join(BASE_DIR, 'cache')),
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION', '127.0.0.1:11211'),
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[os.environ.get('YATUBE_CACHE', 'locmem')],
+}
+
+# Фрагменты лент инвалидируются сигналами (posts.feed_cache), а
+# карточки постов меняют ключ вместе с постом, поэтому их можно хранить
+# долго.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Метрики запросов (core.metrics) сохраняются в общий кэш не чаще раза
+# в METRICS_FLUSH_INTERVAL секунд; их отдает /metrics и команда slow_views.
+METRICS_FLUSH_INTERVAL = 10
+
+# Бюджеты SQL-запросов представлений (core.query_budget): в тестах
+# превышение — ошибка, в работе — предупреждение в логе для доли
+# QUERY_BUDGET_LOG_SAMPLE ответов. Бюджеты своих представлений задает
+# декоратор @query_budget, а здесь их можно переопределить по имени.
+QUERY_BUDGETS = {}
+QUERY_BUDGET_RAISE = False
+QUERY_BUDGET_LOG_SAMPLE = 0.1
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Страницы для анонимных пользователей кэшируются CDN или обратным
+# прокси на EDGE_CACHE_TIMEOUT и сбрасываются по суррогатным ключам
+# (core.purge): адрес сброса задает переменная YATUBE_PURGE_URL.
+EDGE_CACHE_TIMEOUT = 60 * 60 * 24
+EDGE_PURGE_URL = os.environ.get('YATUBE_PURGE_URL')
+EDGE_PURGE_METHOD = os.environ.get('YATUBE_PURGE_METHOD', 'PURGE')
+EDGE_PURGE_BACKEND = ('core.purge.HttpPurgeBackend' if EDGE_PURGE_URL
+                      else 'core.purge.DummyPurgeBackend')
+
+# Посты авторов с большим числом подписчиков не раскладываются по лентам
+# подписок, а подмешиваются при чтении. None — всегда раскладывать.
+FOLLOW_FEED_PULL_THRESHOLD = 1000
+
+# Версии картинок постов (posts.renditions) создаются в фоне
+# (posts.thumbnails). THUMBNAIL_WORKERS = 0 — создавать сразу при
+# сохранении поста, недостающие — командой generate_renditions.
+THUMBNAIL_WORKERS = 2
+POST_IMAGE_WIDTHS = [320, 640, 960]
+POST_IMAGE_QUALITY = 80
+# Картинки с большим числом пикселей отклоняются по заголовку, до
+# декодирования; остальные уменьшаются до POST_IMAGE_MAX_SIDE по
+# большей стороне и пересохраняются.
+POST_IMAGE_MAX_PIXELS = 25_000_000
+POST_IMAGE_MAX_SIDE = 2048
+
+# JSON API (posts.api) только читает данные и отдает только JSON.
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.AllowAny',
+    ],
 }
 
 INTERNAL_IPS = [